@@ -1,85 +1,134 @@
-from flask import Flask, request, jsonify
-import pandas as pd
-import openai
-from transformers import GPT2LMHeadModel, GPT2Tokenizer
-
-# initialize Flask app
-app = Flask(__name__)
-
-# initialize LLM (Hugging Face model)
-# model_name= "gpt2"
-# tokenizer= GPT2Tokenizer.from_pretrained(model_name)
-# model = GPT2LMHeadModel.from_pretrained(model_name)
-
-# example food database
-food_data = pd.DataFrame([
-    {"name": "Grilled chicken salad", "calories": 300, "tags": ["low-carb", "gluten-free"]},
-    {"name": "Steamed veggie bowl", "calories": 400, "tags": ["vegan", "gluten-free"]},
-    {"name": "Ham cheese sandwich", "calories": 450, "tags": ["high-protein"]},
-    {"name": "Fruit smoothie", "calories": 200, "tags": ["vegetarian", "dairy-free"]}
-])
-# filter 
-def filter_items(allergies, preferences):
-    filtered_items = food_data.copy()
-    # print(food_data.head())
-    print(food_data.dtypes)
-    # print(food_data['tags'].apply(type).head())
-
-    #exculde matches
-
-    # include matches
-    if preferences:
-        matching_rows= set()
-        for preference in preferences:
-            print(f"Included items with preference: {preference}")
-            matches = filtered_items[filtered_items['tags'].apply(lambda tags: any(preference.lower() in tag.lower() for tag in tags))].index
-            matching_rows.update(matches)
-            # print(filtered_items)
-        filtered_items = filtered_items.loc[list(matching_rows)]
-    print("final")
-    print(filtered_items)
-    return filtered_items
-
-#recommendation function using the openai
-def generate_recommendations_openai(user_input, filtered_foods):
-    food_list = "\n".join(filtered_foods['name'].tolist())
-    prompt = f"""
-    The user ate: {user_input}.
-    Based on their preferences and allergies, recommend three healthier alternatives from the following list:
-    {food_list}."""
-
-    response = client.chat.completions.create(
-        model= "gpt-4",
-        messages=[
-            {"role": "system", "content": "You are a helpful assistant that provides healthy food recommendations."},
-            {"role": "user", "content": prompt}           
-        ],
-        temperature = 0.7,
-        max_tokens= 150
-    )
-    print(response.choices[0].message.content)
-    return response.choices[0].message.content
-
-# recommendation function
-@app.route('/recommend', methods=['POST'])
-def recommend():
-
-    data = request.get_json()
-    user_input = data.get("user_input", "")
-    allergies = data.get("allergies", [])
-    preferences = data.get("preferences", [])
-
-    # filter food options based on requirements
-    filtered_foods = filter_items(allergies, preferences)
-    # print(filtered_foods)
-    if filtered_foods.empty:
-        return jsonify({"message": "No foods match your preferences and restrictions."})
-    
-    # generate recommendations using the local LLM
-    recommendations = generate_recommendations_openai(user_input, filtered_foods)
-
-    return jsonify({"recommendations": recommendations})
-
-if __name__ == "__main__":
-    app.run(debug=True)
-
+import asyncio
+import logging
+import os
+from quart import Quart, request, jsonify
+from utils.catalog import get_catalog
+from utils.data_loader import rank_by_relevance
+from utils.api_data import aget_meal_nutrition
+from utils.openai_helper import achat_completion
+from utils.llm_scheduler import PRIORITY_HIGH, CircuitOpenError
+import utils.prompts as prompts
+
+# Token usage of OpenAI calls is logged at INFO; LOG_LEVEL=WARNING hides it
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"),
+                    format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+# ASGI app; serve with an ASGI server, e.g. `hypercorn app:app --workers 4`
+app = Quart(__name__)
+
+# Seconds a single recommendation may take before the request fails with 504
+REQUEST_TIMEOUT = float(os.getenv("RECOMMEND_TIMEOUT", "30"))
+# Maximum OpenAI calls in flight per worker
+MAX_CONCURRENT_LLM_CALLS = int(os.getenv("MAX_CONCURRENT_LLM_CALLS", "16"))
+# Maximum user requests accepted in one batch POST
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "50"))
+# Catalog foods offered to the LLM per request
+MAX_CANDIDATES = 20
+
+_llm_slots = None
+
+
+@app.before_serving
+async def startup():
+    global _llm_slots
+    _llm_slots = asyncio.Semaphore(MAX_CONCURRENT_LLM_CALLS)
+    # Load the shared catalog and its indexes before the first request arrives
+    catalog = await asyncio.to_thread(get_catalog, 'foods')
+    await asyncio.to_thread(lambda: catalog.semantic_index)
+
+
+# filter 
+def filter_items(allergies, preferences, cuisine_type=None, meal_type=None, diet_type=None):
+    catalog = get_catalog('foods')
+    positions = catalog.filter(cuisine_type, meal_type, preferences, allergies, diet_type)
+    return catalog.frame, catalog.take(positions)
+
+
+#recommendation function using the openai
+async def generate_recommendations_openai(user_input, filtered_foods):
+    food_list = "\n".join(filtered_foods['name'].tolist())
+    prompt = prompts.render(prompts.CATALOG_ALTERNATIVES,
+                            history=prompts.history(user_input, keep='tail'), options=food_list)
+
+    # shares the on-disk response cache with the Streamlit app
+    async with _llm_slots:
+        return await achat_completion(
+            [
+                {"role": "system", "content": "You are a helpful assistant that provides healthy food recommendations."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature = 0.7,
+            max_tokens= 150,
+            priority=PRIORITY_HIGH
+        )
+
+
+async def recommend_for(data):
+    """Recommendations for one user request, or an error message"""
+    user_input = data.get("user_input", "")
+    allergies = data.get("allergies", [])
+    preferences = data.get("preferences", [])
+
+    # filter food options based on requirements
+    catalog_frame, filtered_foods = filter_items(allergies, preferences,
+                                                 data.get("cuisine_type"), data.get("meal_type"),
+                                                 data.get("diet_type"))
+    if filtered_foods.empty:
+        return {"message": "No foods match your preferences and restrictions."}
+
+    # offer the LLM only the catalog foods most relevant to what the user ate
+    candidates = rank_by_relevance(filtered_foods, user_input, source=catalog_frame, top_k=MAX_CANDIDATES)
+    try:
+        recommendations = await asyncio.wait_for(
+            generate_recommendations_openai(user_input, candidates), REQUEST_TIMEOUT)
+    except asyncio.TimeoutError:
+        return {"error": "Recommendation timed out", "status": 504}
+    except CircuitOpenError as e:
+        return {"error": str(e), "status": 503}
+    except Exception as e:
+        return {"error": f"Recommendation failed: {e}", "status": 502}
+
+    return {"recommendations": recommendations, "candidates": candidates['name'].tolist()}
+
+
+# recommendation function
+@app.route('/recommend', methods=['POST'])
+async def recommend():
+    data = await request.get_json()
+    if not isinstance(data, dict):
+        return jsonify({"error": "Expected a JSON object"}), 400
+
+    result = await recommend_for(data)
+    status = result.pop("status", 200)
+    return jsonify(result), status
+
+
+# batch recommendation function
+@app.route('/recommend/batch', methods=['POST'])
+async def recommend_batch():
+    data = await request.get_json()
+    requests = data.get("requests") if isinstance(data, dict) else None
+    if not isinstance(requests, list) or not all(isinstance(item, dict) for item in requests):
+        return jsonify({"error": "Expected {\"requests\": [...]} with a JSON object per user"}), 400
+    if len(requests) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"At most {MAX_BATCH_SIZE} requests per batch"}), 413
+
+    # every request in the batch runs concurrently, bounded by the LLM semaphore
+    results = await asyncio.gather(*(recommend_for(item) for item in requests))
+    for result in results:
+        result.pop("status", None)
+    return jsonify({"results": results})
+
+
+# meal nutrition function
+@app.route('/nutrition', methods=['POST'])
+async def nutrition():
+    data = await request.get_json()
+    meal = data.get("meal") if isinstance(data, dict) else None
+    if not isinstance(meal, str) or not meal.strip():
+        return jsonify({"error": "Expected {\"meal\": \"...\"}"}), 400
+    return jsonify(await aget_meal_nutrition(meal))
+
+
+if __name__ == "__main__":
+    app.run()
@@ -1,7 +1,66 @@
 import streamlit as st
 import pandas as pd
 import json
-from utils.openai_helper import analyze_recipe, suggest_recipes, explain_food
+from utils.openai_helper import suggest_recipes
+from utils.insights import food_insight_key, recipe_insight_key, get_food_insight, get_recipe_insight
+
+
+def _stream_markdown(chunks):
+    """Render text chunks into a placeholder as they arrive and return the full text"""
+    placeholder = st.empty()
+    placeholder.caption("Generating analysis...")
+    text = ""
+    for chunk in chunks or []:
+        text += chunk
+        placeholder.markdown(text + "▌")
+    if text:
+        placeholder.markdown(text)
+    else:
+        placeholder.empty()
+    return text
+
+
+def _show_insight(key, generate):
+    """Show the insight stored for key, streaming it only on first render or on regenerate"""
+    insights = st.session_state.setdefault('insights', {})
+    refresh = st.button("🔄 Regenerate", key=f"regenerate_{key}")
+    if refresh or key not in insights:
+        text = _stream_markdown(generate(refresh))
+        # Failures are not memoized so the next render can retry
+        if text:
+            insights[key] = text
+        else:
+            st.info("Analysis not available.")
+        return
+    st.markdown(insights[key])
+
+
+def _partial_item_lines(item):
+    """Markdown lines for the fields of a partially generated item"""
+    lines = [f"**{item.get('name', '...')}**"]
+    for field, label in [('description', None), ('cuisine_type', 'Cuisine'), ('meal_type', 'Meal Type'),
+                         ('calories', 'Calories'), ('protein', 'Protein'), ('carbs', 'Carbs'),
+                         ('fat', 'Fat'), ('prep_time', 'Prep Time'), ('cooking_time', 'Cooking Time')]:
+        if field in item:
+            lines.append(f"{label}: {item[field]}" if label else str(item[field]))
+    return lines
+
+
+def display_partial_item(placeholder, item):
+    """Preview recommendations while their JSON is still streaming in"""
+    items = item if isinstance(item, list) else [item]
+    blocks = ["  \n".join(_partial_item_lines(i)) for i in items if isinstance(i, dict) and i]
+    if blocks:
+        placeholder.markdown("\n\n".join(blocks))
+
+def _has_allergens(value):
+    """Whether an allergens field names any allergen"""
+    return pd.notna(value) and str(value).strip() not in ['', 'None']
+
+
+def _minutes(value):
+    return f"{value:g} mins" if pd.notna(value) else 'N/A'
+
 
 def display_food(food, is_openai_mode=False):
     """Display a food item with nutritional info and analysis"""
@@ -14,40 +73,25 @@ def display_food(food, is_openai_mode=False):
     with col1:
 
         # Show food description
-        if 'description' in food and food['description'] != 'N/A':
+        if 'description' in food and pd.notna(food['description']):
             st.write(food['description'])
 
         # Show dietary info and allergens
         st.markdown("**Dietary Information:** " + str(food['dietary_info']))
 
-        if 'allergens' in food and food['allergens'] not in ['None', 'N/A']:
+        if 'allergens' in food and _has_allergens(food['allergens']):
             st.markdown("**Contains allergens:** " + str(food['allergens']))
         else:
             st.markdown("**Allergens:** None declared")
 
-        # Build nutritional text for analysis
-        nutritional_info = f"""
-        - Calories: {food['calories']}
-        - Protein: {food['protein']}g
-        - Carbs: {food['carbs']}g
-        - Fat: {food['fat']}g
-        """
-
         # Generate or show AI-powered insights
         st.markdown("### Insights")
 
-        # Generate food explanation with OpenAI
-        with st.spinner("Generating analysis..."):
-            food_explanation = explain_food(
-                food['name'], 
-                nutritional_info, 
-                food['description'] if 'description' in food else ""
-            )
-
-        if food_explanation:
-            st.markdown(food_explanation)
-        else:
-            st.info("Analysis not available.")
+        # Stream the food explanation from OpenAI once per food; reruns reuse it
+        _show_insight(
+            food_insight_key(food),
+            lambda refresh: get_food_insight(food, refresh, stream=True)
+        )
 
     with col2:
         # Food type info
@@ -68,11 +112,9 @@ def display_recipe(recipe, is_openai_mode=False):
         # Recipe details
         time_col1, time_col2 = st.columns(2)
         with time_col1:
-            prep_time = recipe['prep_time'] if recipe['prep_time'] != 'N/A' else 'N/A'
-            st.metric("Prep Time", f"{prep_time} mins" if prep_time != 'N/A' else 'N/A')
+            st.metric("Prep Time", _minutes(recipe['prep_time']))
         with time_col2:
-            cooking_time = recipe['cooking_time'] if recipe['cooking_time'] != 'N/A' else 'N/A'
-            st.metric("Cooking Time", f"{cooking_time} mins" if cooking_time != 'N/A' else 'N/A')
+            st.metric("Cooking Time", _minutes(recipe['cooking_time']))
 
         # Ingredients
         st.markdown("### Ingredients")
@@ -100,16 +142,10 @@ def display_recipe(recipe, is_openai_mode=False):
 
         # Analysis and suggestions
         st.markdown("### AI Recipe Analysis")
-        with st.spinner("Analyzing recipe..."):
-            analysis = analyze_recipe(
-                recipe['name'],
-                recipe['ingredients'],
-                recipe['instructions']
-            )
-            if analysis:
-                st.markdown(analysis)
-            else:
-                st.info("Analysis not available.")
+        _show_insight(
+            recipe_insight_key(recipe),
+            lambda refresh: get_recipe_insight(recipe, refresh, stream=True)
+        )
 
     with col2:
         # Recipe metadata
@@ -117,7 +153,7 @@ def display_recipe(recipe, is_openai_mode=False):
         st.markdown(f"**Meal Type:** {recipe['meal_type']}")
         st.markdown(f"**Dietary Info:** {recipe['dietary_info']}")
 
-        if recipe['allergens'] not in ['None', 'N/A']:
+        if _has_allergens(recipe['allergens']):
             st.markdown(f"**Contains allergens:** {recipe['allergens']}")
         else:
             st.markdown("**Allergens:** None declared")
\ No newline at end of file
@@ -1,18 +1,29 @@
 import streamlit as st
+from utils.diet_rules import get_diet_rules
 
-def show_filters():
-    """Display filter options"""
+def _index(options, value):
+    """Position of a saved value among a selectbox's options, or the first option"""
+    return options.index(value) if value in options else 0
+
+def show_filters(profile=None):
+    """Display filter options, starting from a saved profile's values when one is given"""
+    profile = profile or {}
     st.sidebar.header("Filters")
     
     # Physical metrics
     st.sidebar.subheader("Physical Metrics")
-    sex = st.sidebar.selectbox("Sex", ["Male", "Female"])
-    age = st.sidebar.number_input("Age", min_value=1, max_value=120, value=30)
-    weight = st.sidebar.number_input("Weight (kg)", min_value=20.0, max_value=300.0, value=70.0, step=0.1)
-    height = st.sidebar.number_input("Height (cm)", min_value=50.0, max_value=250.0, value=170.0, step=0.1)
+    sex_options = ["Male", "Female"]
+    sex = st.sidebar.selectbox("Sex", sex_options, index=_index(sex_options, profile.get('sex')))
+    age = st.sidebar.number_input("Age", min_value=1, max_value=120, value=int(profile.get('age', 30)))
+    weight = st.sidebar.number_input("Weight (kg)", min_value=20.0, max_value=300.0,
+                                     value=float(profile.get('weight', 70.0)), step=0.1)
+    height = st.sidebar.number_input("Height (cm)", min_value=50.0, max_value=250.0,
+                                     value=float(profile.get('height', 170.0)), step=0.1)
+    activity_options = ["Sedentary", "Lightly Active", "Moderately Active", "Very Active"]
     activity_level = st.sidebar.selectbox(
         "Physical Activity Level",
-        ["Sedentary", "Lightly Active", "Moderately Active", "Very Active"]
+        activity_options,
+        index=_index(activity_options, profile.get('activity_level'))
     )
     activty_info = {
         "Sedentary": "Little to no exercise",
@@ -23,47 +34,51 @@ def show_filters():
     # Diet type selector
     st.sidebar.subheader("Diet Plan")
     
-    # Diet descriptions with detailed information
-    diet_info = {
-        "None": "No specific diet plan selected.",
-        "Keto Diet": "A high-fat, low-carb diet that aims to put your body in a state of ketosis, where it burns fat for energy instead of carbohydrates. It typically consists of 70-80% fat, 10%-20% protein, and 5-10% carbohydrates.",
-        "Portfolio Diet": "A plant-based diet designed to lower cholesterol and prevent heart diease. Emphasizes nuts, plant protein (soy), soluble fiber (oats, barley), and plant sterols. This discourages using from animal sources, specficly red and processed meat, high-fat dairy, and eggs, which makes it's naturally low in saturated fat and dietary cholesterol",
-        "DASH Diet": "Dietary Approaches to Stop Hypertension. High in fruits, vegetables, whole grains, lean proteins (fish, poultry, beans, nuts), and low-fat or fat-free dairy. Limits items high in saturated fat and sugar."
-    }
-    
+    # Diets and their descriptions come from the diet rules file
+    diets = get_diet_rules()
+    diet_options = ["None"] + list(diets)
     diet_type = st.sidebar.selectbox(
         "Select Diet Type",
-        list(diet_info.keys())
+        diet_options,
+        index=_index(diet_options, profile.get('diet_type'))
     )
     
     # Display info text for selected diet
-    if diet_type != "None":
-        st.sidebar.info(diet_info[diet_type])
+    if diet_type != "None" and diets[diet_type].description:
+        st.sidebar.info(diets[diet_type].description)
 
     # Basic filters
     st.sidebar.subheader("Food Preferences")
+    cuisine_options = ["All", "American", "Italian", "Asian", "Mediterranean", "International"]
     cuisine_type = st.sidebar.selectbox(
         "Cuisine Type",
-        ["All", "American", "Italian", "Asian", "Mediterranean", "International"]
+        cuisine_options,
+        index=_index(cuisine_options, profile.get('cuisine_type'))
     )
 
+    meal_options = ["All", "Appetizer", "Main Course", "Dessert"]
     meal_type = st.sidebar.selectbox(
         "Meal Type",
-        ["All", "Appetizer", "Main Course", "Dessert"]
+        meal_options,
+        index=_index(meal_options, profile.get('meal_type'))
     )
 
     # Dietary Preferences
     st.sidebar.subheader("Dietary Preferences")
+    preference_options = ["Vegetarian", "Vegan", "Low-Calorie", "Low-Fat", "Low-Carb", "High-Protein", "Gluten-Free"]
     preferences = st.sidebar.multiselect(
         "Select Preferences",
-        ["Vegetarian", "Vegan", "Low-Calorie", "Low-Fat", "Low-Carb", "High-Protein", "Gluten-Free"]
+        preference_options,
+        default=[p for p in profile.get('preferences', []) if p in preference_options]
     )
 
     # Allergen Restrictions
     st.sidebar.subheader("Allergen Restrictions")
+    allergen_options = ["Gluten", "Dairy", "Eggs", "Nuts", "Soy", "Sesame"]
     allergens = st.sidebar.multiselect(
         "Select Allergens to Avoid",
-        ["Gluten", "Dairy", "Eggs", "Nuts", "Soy", "Sesame"]
+        allergen_options,
+        default=[a for a in profile.get('allergens', []) if a in allergen_options]
     )
 
     return cuisine_type, meal_type, preferences, allergens, age, weight, height, activity_level, sex, diet_type
\ No newline at end of file
@@ -1,44 +1,41 @@
 import streamlit as st
 import pandas as pd
+from utils.intake_ledger import get_intake_ledger, DEFAULT_USER
 
-def track_recent_foods():
-    """Track and display recently eaten foods"""
+def track_recent_foods(user=DEFAULT_USER):
+    """Track and display the foods eaten today, kept in the intake ledger across sessions"""
     st.sidebar.subheader("Recently Eaten Foods")
-    
-    # Initialize session state for recent foods if not exists
-    if 'recent_foods' not in st.session_state:
-        st.session_state.recent_foods = []
+    ledger = get_intake_ledger()
     
     # Add new food form
     with st.sidebar.form("add_food_form"):
         food_name = st.text_input("Food Name")
-        col1, col2, col3 = st.columns(3)
+        col1, col2, col3, col4 = st.columns(4)
         with col1:
             protein = st.number_input("Protein (g)", min_value=0.0, step=0.1)
         with col2:
             carbs = st.number_input("Carbs (g)", min_value=0.0, step=0.1)
         with col3:
             fat = st.number_input("Fat (g)", min_value=0.0, step=0.1)
+        with col4:
+            calories = st.number_input("Calories", min_value=0.0, step=1.0)
         
         if st.form_submit_button("Add Food"):
             if food_name:
-                new_food = {
-                    'name': food_name,
-                    'protein': protein,
-                    'carbs': carbs,
-                    'fat': fat
-                }
-                st.session_state.recent_foods.append(new_food)
+                ledger.add(user, food_name, protein=protein, carbs=carbs, fat=fat, calories=calories)
     
-    # Display recent foods
-    if st.session_state.recent_foods:
-        for food in st.session_state.recent_foods:
-            with st.sidebar.expander(f"🍽️ {food['name']}"):
-                st.write(f"Protein: {food['protein']}g")
-                st.write(f"Carbs: {food['carbs']}g")
-                st.write(f"Fat: {food['fat']}g")
+    # Display today's foods in one table with the running totals
+    today = ledger.day(user)
+    if today:
+        with st.sidebar.expander(f"🍽️ {len(today)} foods today"):
+            st.dataframe(pd.DataFrame([{'name': food.name, 'protein': food.protein, 'carbs': food.carbs,
+                                        'fat': food.fat, 'calories': food.calories} for food in today]),
+                         hide_index=True)
+        totals = today.totals()
+        st.sidebar.caption(f"Today: {totals['calories']:g} kcal, {totals['protein']:g}g protein, "
+                           f"{totals['carbs']:g}g carbs, {totals['fat']:g}g fat")
         
         if st.sidebar.button("Clear Recent Foods"):
-            st.session_state.recent_foods = []
+            ledger.clear_day(user)
     
-    return st.session_state.recent_foods
+    return today
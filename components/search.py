@@ -1,10 +1,14 @@
-
 import streamlit as st
 
-def show_search():
-    """Display search bar"""
-    return st.text_input(
+def show_search(suggest=None):
+    """Display search bar, with suggestions for the typed text when suggest is given"""
+    search_term = st.text_input(
         "Search foods and recipes",
         placeholder="Enter food or recipe name...",
         key="food_search_input"
     )
+    if suggest and search_term:
+        suggestions = suggest(search_term)
+        if suggestions:
+            st.caption("Did you mean: " + ", ".join(suggestions))
+    return search_term
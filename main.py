@@ -1,13 +1,21 @@
 import streamlit as st
+import logging
 import os
 import pandas as pd
-from utils.data_loader import load_food_data, load_recipe_data, search_items, filter_items
+from utils.data_loader import search_items, filter_items, rank_by_relevance
+from utils.openai_helper import rerank_items
+from utils.catalog import get_catalog
 from components.search import show_search
 from components.filters import show_filters
-from components.display import display_food, display_recipe
+from components.display import display_food, display_recipe, display_partial_item
 #from components.recent_foods import track_recent_foods #Removed
 from utils.recommendation import calculate_daily_targets
-from utils.openai_helper import generate_summary
+from utils.pipeline import run_recommendations
+from utils.user_store import DEFAULT_USER, inputs_key, load_profile, save_profile, load_run, save_run
+
+# Token usage of OpenAI calls is logged at INFO; LOG_LEVEL=WARNING hides it
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"),
+                    format="%(asctime)s %(levelname)s %(name)s: %(message)s")
 
 # Page configuration
 st.set_page_config(page_title="Food & Recipe Recommendations",
@@ -20,63 +28,136 @@ st.write(
     "Discover delicious foods and recipes tailored to your preferences and dietary restrictions!"
 )
 
-# Always use OpenAI mode
-use_openai_only = True
-if not os.getenv("OPENAI_API_KEY"):
+# Number of foods and recipes generated per OpenAI call
+RECOMMENDATION_COUNT = 3
+
+# Recommendations come from the local catalog unless AI generation is chosen
+has_openai_key = bool(os.getenv("OPENAI_API_KEY"))
+recommendation_source = st.sidebar.radio(
+    "Recommendation source",
+    ["Catalog", "AI-generated"],
+    help="Catalog recommendations are retrieved instantly from the local catalog; AI-generated ones come from OpenAI."
+)
+use_openai_only = recommendation_source == "AI-generated"
+rerank_with_ai = False
+if not has_openai_key:
     st.sidebar.error("OpenAI API key not found. Please add it to your secrets.")
     st.sidebar.info("Go to Secrets tool and add OPENAI_API_KEY with your API key.")
     use_openai_only = False
+elif not use_openai_only:
+    rerank_with_ai = st.sidebar.checkbox("Re-rank catalog matches with AI")
+
+# Saved profiles keep the user's inputs and recent results between visits
+user = st.sidebar.text_input("Profile name", value=DEFAULT_USER,
+                             help="Your inputs and recommendations are saved under this name.").strip() or DEFAULT_USER
+if st.session_state.get('profile_user') != user:
+    # A new session or another profile starts from that profile's saved state
+    st.session_state.profile_user = user
+    st.session_state.profile = load_profile(user)
+    for key in ['foods_df', 'recipes_df', 'summary', 'targets', 'meal_plans']:
+        st.session_state.pop(key, None)
+profile = st.session_state.profile
 
 # Food history input
 st.sidebar.subheader("Your Food History")
 food_history = st.sidebar.text_area(
     "Enter what you've eaten today:",
-    value="Today I've eaten: banana, toast, and a glass of whole milk",
+    value=profile.get('food_history', "Today I've eaten: banana, toast, and a glass of whole milk"),
     height=100
 )
 # First get filters for OpenAI recommendations
-cuisine_type, meal_type, preferences, allergens, age, weight, height, activity_level, sex, diet_type = show_filters()
+cuisine_type, meal_type, preferences, allergens, age, weight, height, activity_level, sex, diet_type = show_filters(profile)
 
 # Add submit button in sidebar
 if st.sidebar.button("Generate Recommendations"):
     # Calculate TDEE
     st.session_state.targets = calculate_daily_targets(weight=weight, height=height, age=age, sex=sex, activity_level=activity_level)
+    st.session_state.profile = {'food_history': food_history, 'cuisine_type': cuisine_type, 'meal_type': meal_type,
+                                'preferences': preferences, 'allergens': allergens, 'age': age, 'weight': weight,
+                                'height': height, 'activity_level': activity_level, 'sex': sex,
+                                'diet_type': diet_type}
+    save_profile(user, st.session_state.profile)
     
-    # Generate summary
-    summary = generate_summary(food_history)
-    
-    # Load data
-    foods_df = load_food_data(use_openai_only, preferences, allergens, cuisine_type, meal_type, 
-                            None, # Removed recent_foods
-                            summary if use_openai_only else None)
-    recipes_df = load_recipe_data(use_openai_only, preferences, allergens, cuisine_type, meal_type,
-                                summary if use_openai_only else None)
+    # Generated results are reused while the inputs they came from are unchanged
+    run_key = inputs_key(food_history, use_openai_only, preferences, allergens, cuisine_type, meal_type,
+                         RECOMMENDATION_COUNT)
+    saved_run = load_run(user, run_key) if use_openai_only else None
+    if saved_run is not None:
+        summary, foods_df, recipes_df = saved_run['summary'], saved_run['foods'], saved_run['recipes']
+        st.caption("Showing your saved recommendations for these inputs.")
+    else:
+        # Generate summary and load data concurrently; food and recipe calls start once the summary arrives
+        # Streamed partial results are previewed until the full results are ready
+        previews = {name: st.empty() for name in ['summary', 'foods', 'recipes']}
+        on_partial = {
+            'summary': lambda text: previews['summary'].markdown(text),
+            'foods': lambda item: display_partial_item(previews['foods'], item),
+            'recipes': lambda item: display_partial_item(previews['recipes'], item)
+        }
+        with st.spinner("Generating recommendations..."):
+            summary, foods_df, recipes_df = run_recommendations(food_history, use_openai_only, preferences,
+                                                                allergens, cuisine_type, meal_type,
+                                                                on_partial=on_partial,
+                                                                count=RECOMMENDATION_COUNT)
+        for preview in previews.values():
+            preview.empty()
+        # Failed generations are not saved, so the next attempt calls the API again
+        if not use_openai_only or not (foods_df.empty or recipes_df.empty):
+            save_run(user, run_key, summary, foods_df, recipes_df, use_openai_only)
     
-    # Store the generated data in session state
-    st.session_state.foods_df = foods_df
-    st.session_state.recipes_df = recipes_df
+    # Store the generated data in session state; catalog rows are read from the current catalog on each rerun
+    st.session_state.use_openai_only = use_openai_only
+    st.session_state.foods_df = foods_df if use_openai_only else None
+    st.session_state.recipes_df = recipes_df if use_openai_only else None
     st.session_state.summary = summary
 else:
     # Initialize or show default page
     if 'foods_df' not in st.session_state:
-        st.info("👈 Please fill in your preferences and click 'Generate Recommendations' to get personalized suggestions.")
-        st.session_state.foods_df = pd.DataFrame()
-        st.session_state.recipes_df = pd.DataFrame()
-        st.session_state.summary = None
+        saved_run = load_run(user)
+        if saved_run is not None:
+            # Warm start from the profile's latest results; catalog results are read from the catalog
+            st.session_state.use_openai_only = saved_run['use_openai_only']
+            st.session_state.foods_df = saved_run['foods'] if saved_run['use_openai_only'] else None
+            st.session_state.recipes_df = saved_run['recipes'] if saved_run['use_openai_only'] else None
+            st.session_state.summary = saved_run['summary']
+            st.session_state.targets = calculate_daily_targets(weight=weight, height=height, age=age, sex=sex,
+                                                               activity_level=activity_level)
+        else:
+            st.info("👈 Please fill in your preferences and click 'Generate Recommendations' to get personalized suggestions.")
+            st.session_state.foods_df = pd.DataFrame()
+            st.session_state.recipes_df = pd.DataFrame()
+            st.session_state.summary = None
     
-    # Use stored data
+    # Use stored data; a catalog run keeps no frames, so a reloaded catalog and its indexes are used as they are
     foods_df = st.session_state.foods_df
     recipes_df = st.session_state.recipes_df
+    if foods_df is None:
+        foods_df = get_catalog('foods').frame
+        recipes_df = get_catalog('recipes').frame
     summary = st.session_state.summary
 
-# Now get search term for filtering the loaded data
-# search_term = show_search()
+# Render the results in the mode they were generated in
+use_openai_only = st.session_state.get('use_openai_only', use_openai_only)
+
+# Now get search term for filtering the loaded data; only the local catalog is searchable
+search_term = None
+if not use_openai_only and not foods_df.empty:
+    search_term = show_search(suggest=get_catalog('foods').search_index.suggest)
 
 # Apply search and filters for preferences and allergies
 if not use_openai_only:
-    # filtered_foods = search_items(foods_df, search_term)
-    filtered_foods = filter_items(foods_df, cuisine_type, meal_type,
-                                preferences, allergens)
+    filtered_foods = search_items(foods_df, search_term)
+    filtered_foods = filter_items(filtered_foods, cuisine_type, meal_type,
+                                preferences, allergens, diet_type=diet_type)
+    # Without a search, order catalog matches by relevance to the food history
+    if not search_term:
+        filtered_foods = rank_by_relevance(filtered_foods, food_history, source=foods_df)
+        if rerank_with_ai and len(filtered_foods) > 1:
+            # The LLM only re-orders the best few retrieved candidates
+            candidates = filtered_foods.head(10)
+            order = rerank_items(food_history, candidates['name'].tolist())
+            if order:
+                filtered_foods = pd.concat([candidates.iloc[order], filtered_foods.iloc[len(candidates):]])
 else:
     filtered_foods = foods_df
 
@@ -89,22 +170,39 @@ else:
 #    filtered_recipes = filter_items(filtered_recipes, cuisine_type, meal_type,
 #                                    preferences, allergens)
 #else:
-filtered_recipes = recipes_df
+if not use_openai_only:
+    filtered_recipes = search_items(recipes_df, search_term)
+    if not search_term:
+        filtered_recipes = rank_by_relevance(filtered_recipes, food_history, source=recipes_df)
+else:
+    filtered_recipes = recipes_df
 
 # Add nutritional info lookup
 st.markdown("### 🍎 Nutrition Lookup")
-food_query = st.text_input("Enter a food to get nutrition info:")
+food_query = st.text_input("Enter a food or a whole meal to get nutrition info:",
+                           placeholder="banana, 2 slices of toast and a glass of whole milk")
 if st.button("Get Nutrition Info"):
     if food_query:
-        from utils.api_data import get_nutritional_info
-        nutrition_data = get_nutritional_info(food_query)
-        if "error" not in nutrition_data:
+        from utils.api_data import get_meal_nutrition
+        meal = get_meal_nutrition(food_query)
+        if meal["success"]:
             st.markdown("#### Nutritional Information:")
+            if len(meal["items"]) > 1:
+                st.dataframe(pd.DataFrame(meal["items"])[['query', 'calories', 'protein', 'carbs', 'fat', 'fiber']],
+                             hide_index=True)
+                st.markdown("**Total**")
+            else:
+                item = meal["items"][0]
+                if 'grams' in item:
+                    st.caption(f"Matched {item['name']} ({item['grams']:g} g)")
+            nutrition_data = meal["totals"]
             st.write(f"Calories: {nutrition_data['calories']}")
             st.write(f"Protein: {nutrition_data['protein']}g")
             st.write(f"Carbs: {nutrition_data['carbs']}g")
             st.write(f"Fat: {nutrition_data['fat']}g")
             st.write(f"Fiber: {nutrition_data['fiber']}g")
+            if meal["unmatched"]:
+                st.warning("No nutrition data found for: " + ", ".join(meal["unmatched"]))
         else:
             st.error("Could not fetch nutritional information")
     else:
@@ -125,6 +223,29 @@ if use_openai_only and summary:
     st.write(summary)
 st.markdown("---")
 
+# Meal plans combine catalog foods and recipes to meet the day's targets
+st.header("🗓️ Meal Plans")
+if st.button("Build Meal Plans"):
+    from utils.meal_plan import build_meal_plans
+    targets = st.session_state.targets or calculate_daily_targets(weight=weight, height=height, age=age,
+                                                                  sex=sex, activity_level=activity_level)
+    st.session_state.meal_plans = build_meal_plans(get_catalog('foods').frame, get_catalog('recipes').frame,
+                                                   targets, cuisine_type=cuisine_type, meal_type=meal_type,
+                                                   preferences=preferences, allergens=allergens,
+                                                   diet_type=diet_type)
+meal_plans = st.session_state.get('meal_plans')
+if meal_plans is not None:
+    if not meal_plans:
+        st.info("No meal plan could be built from items matching your criteria. Try adjusting your filters.")
+    else:
+        for tab, plan in zip(st.tabs([f"Plan {i}" for i in range(1, len(meal_plans) + 1)]), meal_plans):
+            with tab:
+                columns = [col for col in ['name', 'kind', 'calories', 'protein', 'carbs', 'fat']
+                           if col in plan['items'].columns]
+                st.dataframe(plan['items'][columns], hide_index=True)
+                st.dataframe(pd.DataFrame({'Planned': plan['totals'], 'Target': plan['targets']}))
+st.markdown("---")
+
 # Display results
 st.header("📋 Available Meal Options")
 if filtered_foods.empty:
@@ -138,10 +259,11 @@ else:
 
     # Display foods based on mode
     if use_openai_only:
-        # Display only first item in OpenAI mode
-        if not filtered_foods.empty:
-            display_food(filtered_foods.iloc[0], is_openai_mode=True)
-            st.markdown("---")
+        # Display one generated option at a time; paging needs no extra round trip
+        option = st.radio("Food option", range(1, total_foods + 1), horizontal=True,
+                          key="food_option") if total_foods > 1 else 1
+        display_food(filtered_foods.iloc[option - 1], is_openai_mode=True)
+        st.markdown("---")
     else:
         # Display up to 3 items in normal mode
         for _, food in filtered_foods.head(3).iterrows():
@@ -170,10 +292,11 @@ else:
 
     # Display recipes based on mode
     if use_openai_only:
-        # Display only first item in OpenAI mode
-        if not filtered_recipes.empty:
-            display_recipe(filtered_recipes.iloc[0], is_openai_mode=True)
-            st.markdown("---")
+        # Display one generated option at a time; paging needs no extra round trip
+        option = st.radio("Recipe option", range(1, total_recipes + 1), horizontal=True,
+                          key="recipe_option") if total_recipes > 1 else 1
+        display_recipe(filtered_recipes.iloc[option - 1], is_openai_mode=True)
+        st.markdown("---")
     else:
         # Display up to 3 items in normal mode
         for _, recipe in filtered_recipes.head(3).iterrows():
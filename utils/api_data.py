@@ -1,7 +1,17 @@
 import os
+import re
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import streamlit as st
 import pandas as pd
+from utils.search_index import SearchIndex
+from utils.nutrition_db import get_nutrition_db
+from utils.llm_cache import CACHE_DIR, ResponseCache, make_key
 
 # Cache API responses to avoid rate limits and improve performance
 @st.cache_data(ttl=3600)  # Cache for 1 hour
@@ -82,7 +92,7 @@ def fetch_food_data(query=None, cuisine_type=None, meal_type=None):
 
         # Apply filters if provided
         if query:
-            df = df[df['name'].str.contains(query, case=False, na=False)]
+            df = df.iloc[SearchIndex(df).search(query)]
         if cuisine_type and cuisine_type != "All":
             df = df[df['cuisine_type'] == cuisine_type]
         if meal_type and meal_type != "All":
@@ -148,7 +158,7 @@ def fetch_recipe_data(query=None, cuisine_type=None, meal_type=None):
 
         # Apply filters if provided
         if query:
-            df = df[df['name'].str.contains(query, case=False, na=False)]
+            df = df.iloc[SearchIndex(df).search(query)]
         if cuisine_type and cuisine_type != "All":
             df = df[df['cuisine_type'] == cuisine_type]
         if meal_type and meal_type != "All":
@@ -159,40 +169,242 @@ def fetch_recipe_data(query=None, cuisine_type=None, meal_type=None):
         st.error(f"Error fetching recipe data: {str(e)}")
         return pd.DataFrame()
 
-def get_nutritional_info(food_name):
-    "Fetch nutritional information from Nutritionix API"
+# Nutritionix endpoint used when a food is not in the local nutrition table
+NUTRITIONIX_API_URL = os.getenv("NUTRITIONIX_API_URL", "https://trackapi.nutritionix.com/v2/natural/nutrients")
+# Seconds to wait for Nutritionix before giving up
+NUTRITIONIX_TIMEOUT = float(os.getenv("NUTRITIONIX_TIMEOUT", "10"))
+# Kept-alive connections per host
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))
+
+# Remote lookups are cached on disk; nutrition facts rarely change
+nutrition_cache = ResponseCache(
+    os.path.join(CACHE_DIR, "nutrition.sqlite3"),
+    ttl=int(os.getenv("NUTRITION_CACHE_TTL", str(30 * 24 * 3600))),
+    max_bytes=10 * 1024 * 1024)
+
+# Macros summed over the items of a meal
+MEAL_NUTRIENTS = ['calories', 'protein', 'carbs', 'fat', 'fiber']
+
+_session = None
+_async_client = None
+_session_lock = threading.Lock()
+
+
+def get_http_session():
+    """Shared keep-alive session that retries rate-limited and failed requests with backoff"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                retry = Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                              allowed_methods=frozenset({'GET', 'POST'}), respect_retry_after_header=True)
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+                session = requests.Session()
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _session = session
+    return _session
+
+
+def get_async_http_client():
+    """Shared async client with a bounded keep-alive pool, for the API server"""
+    global _async_client
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(
+            timeout=NUTRITIONIX_TIMEOUT,
+            limits=httpx.Limits(max_connections=HTTP_POOL_SIZE, max_keepalive_connections=HTTP_POOL_SIZE),
+            transport=httpx.AsyncHTTPTransport(retries=2))
+    return _async_client
+
+
+def _nutritionix_request(query):
+    """Headers and body of a Nutritionix natural-language query, or None without credentials"""
+    # You'll need to add these to your environment variables
+    app_id = os.getenv('NUTRITIONIX_APP_ID')
+    app_key = os.getenv('NUTRITIONIX_APP_KEY')
+    if not app_id or not app_key:
+        return None
+    headers = {
+        "x-app-id": app_id,
+        "x-app-key": app_key,
+        "Content-Type": "application/json"
+    }
+    return headers, {"query": query}
+
+
+def _nutrition_from_food(food):
+    return {
+        "name": food.get("food_name"),
+        "calories": food.get("nf_calories", 0),
+        "protein": food.get("nf_protein", 0),
+        "carbs": food.get("nf_total_carbohydrate", 0),
+        "fat": food.get("nf_total_fat", 0),
+        "fiber": food.get("nf_dietary_fiber", 0),
+        "source": "nutritionix",
+        "success": True
+    }
+
+
+def _combine_foods(foods):
+    """One result for a phrase Nutritionix answered with several foods ("toast and jam"), summing their nutrients"""
+    if len(foods) == 1:
+        return foods[0]
+    combined = {n: round(sum(float(food.get(n) or 0) for food in foods), 1) for n in MEAL_NUTRIENTS}
+    combined.update({"name": " + ".join(str(food.get("name")) for food in foods),
+                     "source": "nutritionix", "success": True})
+    return combined
+
+
+def _parse_nutritionix(status_code, data):
+    """Per-food results of a Nutritionix response, or an error dict"""
+    if status_code == 200 and data.get('foods'):
+        return [_nutrition_from_food(food) for food in data['foods']]
+    return {"error": f"API request failed with status {status_code}"}
+
+
+def fetch_remote_foods(query):
+    """Nutrition of every food Nutritionix finds in query, or an error dict"""
     try:
-        # You'll need to add these to your environment variables
-        app_id = os.getenv('NUTRITIONIX_APP_ID')
-        app_key = os.getenv('NUTRITIONIX_APP_KEY')
+        request = _nutritionix_request(query)
+        if request is None:
+            return {"error": "API credentials not found"}
+        headers, body = request
+        response = get_http_session().post(NUTRITIONIX_API_URL, headers=headers, json=body,
+                                           timeout=NUTRITIONIX_TIMEOUT)
+        return _parse_nutritionix(response.status_code, response.json() if response.status_code == 200 else {})
+    except Exception as e:
+        return {"error": str(e)}
+
 
-        if not app_id or not app_key:
+async def afetch_remote_foods(query):
+    """Async fetch_remote_foods over the shared httpx client"""
+    try:
+        request = _nutritionix_request(query)
+        if request is None:
             return {"error": "API credentials not found"}
+        headers, body = request
+        response = await get_async_http_client().post(NUTRITIONIX_API_URL, headers=headers, json=body)
+        return _parse_nutritionix(response.status_code, response.json() if response.status_code == 200 else {})
+    except Exception as e:
+        return {"error": str(e)}
 
-        url = "https://trackapi.nutritionix.com/v2/natural/nutrients"
-        headers = {
-            "x-app-id": app_id,
-            "x-app-key": app_key,
-            "Content-Type": "application/json"
-        }
 
-        data = {
-            "query": food_name
-        }
+def fetch_remote_nutrition(food_name):
+    "Fetch nutritional information from Nutritionix API"
+    foods = fetch_remote_foods(food_name)
+    return _combine_foods(foods) if isinstance(foods, list) else foods
+
+
+def _remote_key(query):
+    return make_key('nutritionix', str(query).strip().lower())
 
-        response = requests.post(url, headers=headers, json=data)
-        if response.status_code == 200:
-            data = response.json()
-            if 'foods' in data and len(data['foods']) > 0:
-                food = data['foods'][0]
-                return {
-                    "calories": food.get("nf_calories", 0),
-                    "protein": food.get("nf_protein", 0),
-                    "carbs": food.get("nf_total_carbohydrate", 0),
-                    "fat": food.get("nf_total_fat", 0),
-                    "fiber": food.get("nf_dietary_fiber", 0),
-                    "success": True
-                }
-        return {"error": f"API request failed with status {response.status_code}"}
+
+def _local_nutrition(query):
+    try:
+        return get_nutrition_db().lookup(query)
     except Exception as e:
-        return {"error": str(e)}
\ No newline at end of file
+        print(f"Error searching local nutrition data: {e}")
+        return None
+
+
+def get_nutritional_info(food_name):
+    """Nutritional information for a food or portion ("2 slices of toast").
+
+    The local nutrition table answers first; Nutritionix is asked only for
+    foods it does not know, and successful answers are cached.
+    """
+    local = _local_nutrition(food_name)
+    if local is not None:
+        return local
+
+    key = _remote_key(food_name)
+    cached = nutrition_cache.get(key)
+    if cached is not None:
+        return cached
+    result = fetch_remote_nutrition(food_name)
+    if result.get("success"):
+        nutrition_cache.set(key, result)
+    return result
+
+
+# Separators that always end a meal item
+_ITEM_SEPARATOR = re.compile(r"[,;\n+&]")
+# Words that join two items ("toast and jam") or belong to one dish's name ("mac and cheese")
+_JOINER = re.compile(r"\b(?:and|with)\b", re.I)
+
+
+def split_meal(text):
+    """Split a meal description ("banana, toast, and a glass of whole milk") into item queries.
+
+    A phrase joined by "and" or "with" is split into items only when the
+    local table knows each of them but not the whole phrase; otherwise it
+    stays whole, so dishes like "mac and cheese" reach Nutritionix intact.
+    """
+    queries = []
+    for part in _ITEM_SEPARATOR.split(str(text)):
+        part = part.strip()
+        # The "and" before a list's last item only introduces it
+        while _JOINER.match(part):
+            part = _JOINER.sub('', part, count=1).strip()
+        if not part:
+            continue
+        pieces = [piece.strip() for piece in _JOINER.split(part) if piece.strip()]
+        if len(pieces) > 1 and _local_nutrition(part) is None and \
+                all(_local_nutrition(piece) is not None for piece in pieces):
+            queries.extend(pieces)
+        else:
+            queries.append(part)
+    return queries
+
+
+def _meal_result(queries, results):
+    """Per-item results in meal order, with totals over the items that resolved"""
+    items, unmatched = [], []
+    for query, result in zip(queries, results):
+        if result and result.get("success"):
+            items.append({"query": query, **result})
+        else:
+            unmatched.append(query)
+    totals = {n: round(sum(float(item.get(n) or 0) for item in items), 1) for n in MEAL_NUTRIENTS}
+    return {"items": items, "totals": totals, "unmatched": unmatched, "success": bool(items)}
+
+
+def _resolve_local(queries):
+    """Local and cached results for each query, None where Nutritionix must be asked"""
+    results = []
+    for query in queries:
+        result = _local_nutrition(query)
+        results.append(result if result is not None else nutrition_cache.get(_remote_key(query)))
+    return results
+
+
+def get_meal_nutrition(meal_text):
+    """Per-item and total macros of a meal description.
+
+    Items the local table and cache cannot answer are sent to Nutritionix
+    concurrently, one query each, so every answer belongs to its phrase.
+    """
+    queries = split_meal(meal_text)
+    results = _resolve_local(queries)
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing:
+        with ThreadPoolExecutor(max_workers=min(len(missing), HTTP_POOL_SIZE)) as executor:
+            responses = list(executor.map(fetch_remote_foods, [queries[i] for i in missing]))
+        for i, foods in zip(missing, responses):
+            if isinstance(foods, list):
+                results[i] = _combine_foods(foods)
+                nutrition_cache.set(_remote_key(queries[i]), results[i])
+    return _meal_result(queries, results)
+
+
+async def aget_meal_nutrition(meal_text):
+    """Async get_meal_nutrition; unknown items are looked up concurrently, one request each"""
+    queries = await asyncio.to_thread(split_meal, meal_text)
+    results = await asyncio.to_thread(_resolve_local, queries)
+    missing = [i for i, result in enumerate(results) if result is None]
+    responses = await asyncio.gather(*(afetch_remote_foods(queries[i]) for i in missing))
+    for i, foods in zip(missing, responses):
+        if isinstance(foods, list):
+            results[i] = _combine_foods(foods)
+            await asyncio.to_thread(nutrition_cache.set, _remote_key(queries[i]), results[i])
+    return _meal_result(queries, results)
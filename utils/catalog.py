@@ -0,0 +1,284 @@
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+import utils.api_data as api_data
+from utils.api_data import fetch_food_data, fetch_recipe_data
+from utils.filter_index import FilterIndex
+from utils.diet_rules import get_diet, MACROS
+from utils.search_index import SearchIndex
+from utils.semantic_index import SemanticIndex
+from utils.ingredient_index import IngredientIndex
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:  # The columnar catalog is optional; without pyarrow the CSVs are read directly
+    pa = None
+
+# Where built catalogs are written
+CATALOG_DIR = os.getenv("CATALOG_DIR", os.path.join('data', 'catalog'))
+
+# CSV source and mock API loader for each catalog
+CATALOG_SOURCES = {
+    'foods': ('data/foods.csv', fetch_food_data),
+    'recipes': ('data/recipes.csv', fetch_recipe_data)
+}
+
+# Low-cardinality text columns, stored dictionary-encoded
+CATEGORY_COLUMNS = ['cuisine_type', 'meal_type', 'dietary_info', 'allergens']
+
+# Numeric columns, stored as the smallest type that holds them
+NUMERIC_COLUMNS = {
+    'foods': ['calories', 'protein', 'carbs', 'fat'],
+    'recipes': ['prep_time', 'cooking_time', 'calories', 'protein', 'carbs', 'fat']
+}
+
+# Seconds between checks of the catalog sources for changes
+CATALOG_POLL_SECONDS = float(os.getenv("CATALOG_POLL_SECONDS", "5"))
+
+# Columns the filter path needs
+FILTER_COLUMNS = ['cuisine_type', 'meal_type', 'dietary_info', 'allergens']
+
+
+def catalog_path(kind):
+    """Path of the built catalog file for kind"""
+    return os.path.join(CATALOG_DIR, f"{kind}.arrow")
+
+
+def _compact_numeric(series):
+    """Convert a column to int32 when every value is a whole number, otherwise float32"""
+    values = pd.to_numeric(series, errors='coerce')
+    if values.notna().all() and (values % 1 == 0).all():
+        return values.astype('int32')
+    return values.astype('float32')
+
+
+def read_sources(kind):
+    """Read the CSV and mock API data for kind into one typed DataFrame"""
+    csv_path, fetch = CATALOG_SOURCES[kind]
+    frames = []
+    if os.path.exists(csv_path):
+        frames.append(pd.read_csv(csv_path, dtype={col: 'category' for col in CATEGORY_COLUMNS}))
+    # Uses mock API data
+    frames.append(fetch())
+    df = pd.concat(frames, ignore_index=True)
+
+    for col in NUMERIC_COLUMNS[kind]:
+        if col in df.columns:
+            df[col] = _compact_numeric(df[col])
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    return df
+
+
+def source_mtime(kind):
+    """Latest modification time of the sources a catalog is built from"""
+    csv_path, _ = CATALOG_SOURCES[kind]
+    times = [os.path.getmtime(api_data.__file__)]
+    if os.path.exists(csv_path):
+        times.append(os.path.getmtime(csv_path))
+    return max(times)
+
+
+def is_stale(kind):
+    """Whether the built catalog is missing or older than its sources"""
+    path = catalog_path(kind)
+    return not os.path.exists(path) or os.path.getmtime(path) < source_mtime(kind)
+
+
+def build_catalog(kind):
+    """Convert the sources for kind into an uncompressed Arrow IPC file that can be memory-mapped"""
+    if pa is None:
+        raise RuntimeError("pyarrow is required to build the columnar catalog")
+    df = read_sources(kind)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    os.makedirs(CATALOG_DIR, exist_ok=True)
+    path = catalog_path(kind)
+    # Write to a temporary file and swap it in so readers never see a partial catalog
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+    return path
+
+
+def open_catalog_table(kind, columns=None):
+    """Memory-map a built catalog as an Arrow table, reading only the requested columns"""
+    if is_stale(kind):
+        build_catalog(kind)
+    # The table's buffers point straight into the mapped file, so nothing is copied here
+    table = pa.ipc.open_file(pa.memory_map(catalog_path(kind), 'r')).read_all()
+    if columns:
+        table = table.select([col for col in columns if col in table.column_names])
+    return table
+
+
+def arrow_frame(table):
+    """A DataFrame over an Arrow table's columns; Arrow-backed, so the mapped buffers are not copied"""
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+
+def load_catalog(kind, columns=None):
+    """Load a catalog as a DataFrame, optionally projected to columns"""
+    if pa is None:
+        df = read_sources(kind)
+        return df[[col for col in columns if col in df.columns]] if columns else df
+    return arrow_frame(open_catalog_table(kind, columns))
+
+
+class Catalog:
+    """Immutable snapshot of a catalog and the indexes built over it, shared by every session.
+
+    The frame must be treated as read-only; filters return row positions
+    and callers take just the rows they need. With pyarrow the catalog is
+    a memory-mapped table: filtering reads only FILTER_COLUMNS, and the full
+    frame is created, without copying, the first time something needs it.
+    """
+
+    def __init__(self, kind, mtime, table=None, frame=None):
+        self.kind = kind
+        self.table = table
+        self._frame = frame
+        self.mtime = mtime
+        # Reentrant: the lazy indexes read the lazy frame while holding it
+        self._lock = threading.RLock()
+        self.filter_index = FilterIndex(self.columns(FILTER_COLUMNS))
+        self._search_index = None
+        self._semantic_index = None
+        self._ingredient_index = None
+        self._diet_masks = {}
+
+    @property
+    def frame(self):
+        """Every column of the catalog"""
+        if self._frame is None:
+            with self._lock:
+                if self._frame is None:
+                    self._frame = arrow_frame(self.table)
+        return self._frame
+
+    def columns(self, names):
+        """A frame of just the named columns that exist, read from the table when there is one"""
+        if self.table is None:
+            return self._frame[[col for col in names if col in self._frame.columns]]
+        return arrow_frame(self.table.select([col for col in names if col in self.table.column_names]))
+
+    @property
+    def search_index(self):
+        """Text search index, built on first use"""
+        if self._search_index is None:
+            with self._lock:
+                if self._search_index is None:
+                    self._search_index = SearchIndex(self.frame)
+        return self._search_index
+
+    @property
+    def semantic_index(self):
+        """Embedding index for relevance retrieval, built on first use"""
+        if self._semantic_index is None:
+            with self._lock:
+                if self._semantic_index is None:
+                    self._semantic_index = SemanticIndex(self.frame)
+        return self._semantic_index
+
+    @property
+    def ingredient_index(self):
+        """Ingredient-to-recipe index for "what can I cook" lookups, built on first use"""
+        if self._ingredient_index is None:
+            with self._lock:
+                if self._ingredient_index is None:
+                    self._ingredient_index = IngredientIndex(self.frame)
+        return self._ingredient_index
+
+    def diet_mask(self, diet_type):
+        """Rows allowed by a diet's rules, computed once per diet; None when no diet applies"""
+        diet = get_diet(diet_type)
+        if diet is None:
+            return None
+        if diet_type not in self._diet_masks:
+            with self._lock:
+                if diet_type not in self._diet_masks:
+                    self._diet_masks[diet_type] = diet.mask(self.columns(MACROS), self.filter_index)
+        return self._diet_masks[diet_type]
+
+    def filter(self, cuisine_type=None, meal_type=None, preferences=None, allergens=None, diet_type=None):
+        """Row positions matching the filters"""
+        keep = self.filter_index.mask(cuisine_type, meal_type, preferences, allergens)
+        diet_mask = self.diet_mask(diet_type)
+        if diet_mask is not None:
+            keep &= diet_mask
+        return np.flatnonzero(keep)
+
+    def take(self, positions):
+        """The rows at positions, as a new frame holding only those rows"""
+        return self.frame.iloc[positions]
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+_watcher = None
+
+
+def _load(kind):
+    mtime = source_mtime(kind)
+    if pa is None:
+        return Catalog(kind, mtime, frame=read_sources(kind))
+    return Catalog(kind, mtime, table=open_catalog_table(kind))
+
+
+def _watch_sources():
+    """Reload catalogs in the background when their sources change; readers keep their snapshot"""
+    while True:
+        time.sleep(CATALOG_POLL_SECONDS)
+        for kind, catalog in list(_catalogs.items()):
+            try:
+                if source_mtime(kind) > catalog.mtime:
+                    _catalogs[kind] = _load(kind)
+            except Exception as e:
+                print(f"Error reloading {kind} catalog: {e}")
+
+
+def get_catalog(kind):
+    """The process-wide catalog for kind, loaded on first use"""
+    global _watcher
+    catalog = _catalogs.get(kind)
+    if catalog is not None:
+        return catalog
+    with _catalogs_lock:
+        if kind not in _catalogs:
+            _catalogs[kind] = _load(kind)
+        if _watcher is None:
+            _watcher = threading.Thread(target=_watch_sources, name="catalog-watcher", daemon=True)
+            _watcher.start()
+        return _catalogs[kind]
+
+
+def catalog_for(df):
+    """The loaded catalog whose shared frame is df, or None"""
+    for catalog in list(_catalogs.values()):
+        # Only a frame already handed out can match, so none is created here
+        if catalog._frame is df:
+            return catalog
+    return None
+
+
+def filter_index_for(df):
+    """The prebuilt FilterIndex when df is a shared catalog frame, otherwise a new one"""
+    catalog = catalog_for(df)
+    return catalog.filter_index if catalog is not None else FilterIndex(df)
+
+
+def search_index_for(df, column='name'):
+    """The catalog's SearchIndex when df is a shared catalog frame, otherwise one over column"""
+    catalog = catalog_for(df)
+    return catalog.search_index if catalog is not None else SearchIndex(df, {column: 1.0})
+
+
+if __name__ == "__main__":
+    for kind in CATALOG_SOURCES:
+        print(f"Built {build_catalog(kind)}")
@@ -1,78 +1,81 @@
+import numpy as np
 import pandas as pd
-from utils.api_data import fetch_food_data, fetch_recipe_data
+from utils.catalog import get_catalog, catalog_for, filter_index_for, search_index_for
+from utils.semantic_index import SemanticIndex
+from utils.recommendation import top_k_indices
+from utils.diet_rules import get_diet
 from utils.openai_helper import generate_food_recommendations, generate_recipe_recommendations
 
-def load_food_data(use_openai_only=False, preferences=None, allergens=None, cuisine_type=None, meal_type=None, recent_foods=None, custom_prompt=None):
+def load_food_data(use_openai_only=False, preferences=None, allergens=None, cuisine_type=None, meal_type=None, recent_foods=None, custom_prompt=None, on_partial=None, count=1):
     """Load food data from either OpenAI, CSV, or API"""
     try:
         if use_openai_only:
             # In this mode get recommendations purely from OpenAI
-            openai_data = generate_food_recommendations(preferences, allergens, cuisine_type, meal_type, recent_foods, custom_prompt)
-            # Ensure all required columns exist with default values
-            required_columns = ['name', 'cuisine_type', 'meal_type', 'calories', 
-                'protein', 'carbs', 'fat', 'description', 
-                'dietary_info', 'allergens', 'raw_response']
-            
-            for col in required_columns:
-                if col not in openai_data.columns:
-                    openai_data[col] = "N/A"
+            openai_data = generate_food_recommendations(preferences, allergens, cuisine_type, meal_type, recent_foods, custom_prompt, on_partial, count)
+            # Generated frames always carry the food schema's columns, with numeric macros
             return openai_data
         else:
-            # Load local and API data instead of OpenAI
-            local_df = pd.read_csv('data/foods.csv')
-            # Uses mock API data
-            api_df = fetch_food_data()
-            return pd.concat([local_df, api_df], ignore_index=True)
+            # Use the shared catalog built from the local and API data; it is loaded once per process
+            return get_catalog('foods').frame
     except Exception as e:
         print(f"Error loading food data: {e}")
         return pd.DataFrame()
 
-def load_recipe_data(use_openai_only=False, preferences=None, allergens=None, cuisine_type=None, meal_type=None, custom_prompt=None):
+def load_recipe_data(use_openai_only=False, preferences=None, allergens=None, cuisine_type=None, meal_type=None, custom_prompt=None, on_partial=None, count=1):
     """Load recipe data from either OpenAI, CSV, or API"""
     try:
         if use_openai_only:
             # Generate recommendations purely from OpenAI
-            return generate_recipe_recommendations(preferences, allergens, cuisine_type, meal_type, custom_prompt)
+            return generate_recipe_recommendations(preferences, allergens, cuisine_type, meal_type, custom_prompt, on_partial, count)
         else:
-            # Load local and API data as before
-            local_df = pd.read_csv('data/recipes.csv')
-            api_df = fetch_recipe_data()
-            return pd.concat([local_df, api_df], ignore_index=True)
+            # Use the shared catalog built from the local and API data; it is loaded once per process
+            return get_catalog('recipes').frame
     except Exception as e:
         print(f"Error loading recipe data: {e}")
         return pd.DataFrame()
 #return search items
-def search_items(df, search_term, column='name'):
-    """Search items in dataframe based on search term"""
-    if not search_term:
-        return df
-    return df[df[column].str.contains(search_term, case=False, na=False)]
-
-def filter_items(df, cuisine_type=None, meal_type=None, preferences=None, allergens=None):
-    """Filter items based on cuisine, meal type, preferences and allergens"""
-    filtered_df = df.copy()
+def search_items(df, search_term, column='name', index=None):
+    """Search items in dataframe based on search term, best matches first.
 
-    # Basic filters
-    if cuisine_type and cuisine_type != "All":
-        filtered_df = filtered_df[filtered_df['cuisine_type'] == cuisine_type]
+    Shared catalog frames are searched through the catalog's index over
+    names, descriptions and ingredients; other frames index column. The
+    last word may be a prefix and misspelled words still match.
+    """
+    if not search_term or df.empty:
+        return df
+    index = index if index is not None else search_index_for(df, column)
+    return df.iloc[index.search(search_term, prefix=True)]
 
-    if meal_type and meal_type != "All":
-        filtered_df = filtered_df[filtered_df['meal_type'] == meal_type]
+def rank_by_relevance(df, text, source=None, top_k=None):
+    """Order items by semantic similarity to text, such as the user's food history.
 
-    # Dietary preferences
-    if preferences:
-        for pref in preferences:
-            pref_lower = pref.lower().replace('-', '')
-            filtered_df = filtered_df[
-                filtered_df['dietary_info'].str.contains(pref_lower, case=False, na=False)
-            ]
+    source is the shared catalog frame df was selected from; its prebuilt
+    embeddings are reused. Without one an index is built over df itself.
+    """
+    if df.empty or not text:
+        return df
+    catalog = catalog_for(source if source is not None else df)
+    if catalog is not None:
+        # Rows selected from a catalog keep its positional labels
+        scores = catalog.semantic_index.similarities(text)[df.index.to_numpy()]
+    else:
+        scores = SemanticIndex(df).similarities(text)
+    return df.iloc[top_k_indices(scores, top_k if top_k is not None else len(df))]
 
-    # Allergen restrictions
-    if allergens:
-        for allergen in allergens:
-            allergen_lower = allergen.lower()
-            filtered_df = filtered_df[
-                ~filtered_df['allergens'].str.contains(allergen_lower, case=False, na=True)
-            ]
+def filter_items(df, cuisine_type=None, meal_type=None, preferences=None, allergens=None, index=None,
+                 diet_type=None):
+    """Filter items based on cuisine, meal type, preferences, allergens and the selected diet.
 
-    return filtered_df
\ No newline at end of file
+    index is a FilterIndex built from df. Shared catalog frames reuse the
+    catalog's index, so only the matching rows are copied.
+    """
+    if df.empty:
+        return df
+    index = index if index is not None else filter_index_for(df)
+    keep = index.mask(cuisine_type, meal_type, preferences, allergens)
+    diet = get_diet(diet_type)
+    if diet is not None:
+        # Catalog frames reuse the catalog's mask for the diet
+        catalog = catalog_for(df)
+        keep &= catalog.diet_mask(diet_type) if catalog is not None else diet.mask(df, index)
+    return df.iloc[np.flatnonzero(keep)]
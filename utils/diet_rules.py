@@ -0,0 +1,98 @@
+import json
+import os
+import threading
+import numpy as np
+import pandas as pd
+
+# Diet definitions; adding a diet only needs an entry in this file
+DIET_RULES_PATH = os.getenv("DIET_RULES_PATH", os.path.join('data', 'diet_rules.json'))
+
+# Energy per gram of each macro, in kcal
+MACRO_KCAL = {'protein': 4, 'carbs': 4, 'fat': 9}
+MACROS = list(MACRO_KCAL)
+
+# Selector values that mean no diet
+NO_DIET = {None, '', 'None'}
+
+
+class DietRule:
+    """A diet compiled into arrays, checked against a whole nutrient matrix at once.
+
+    A rule may bound the share of energy each macro provides
+    ("energy_shares": {"fat": [0.7, 0.8]}), require at least one of some
+    dietary tags ("any_tags"), and weight nutrients when scoring ("weights").
+    Its "description" is shown when the diet is selected.
+    """
+
+    def __init__(self, name, rule):
+        self.name = name
+        self.description = rule.get('description', '')
+        shares = rule.get('energy_shares', {})
+        self.lower = np.array([shares.get(macro, [0, 1])[0] for macro in MACROS], dtype=float)
+        self.upper = np.array([shares.get(macro, [0, 1])[1] for macro in MACROS], dtype=float)
+        self.kcal = np.array([MACRO_KCAL[macro] for macro in MACROS], dtype=float)
+        self.any_tags = list(rule.get('any_tags', []))
+        weights = rule.get('weights')
+        self.weights = dict(weights) if weights else None
+
+    def energy_shares(self, matrix, nutrients=MACROS):
+        """Share of each row's macro energy from protein, carbs and fat, and which rows have any macros.
+
+        matrix is (items x nutrients) with columns in the order of nutrients.
+        """
+        energy = matrix[:, [nutrients.index(macro) for macro in MACROS]] * self.kcal
+        total = energy.sum(axis=1, keepdims=True)
+        return energy / np.where(total > 0, total, 1), total[:, 0] > 0
+
+    def fit(self, matrix, nutrients=MACROS):
+        """0-1 score per row: 1 within every share bound, falling off with the distance outside them.
+
+        Rows without macro data score a neutral 1; the rule cannot judge them.
+        """
+        shares, known = self.energy_shares(matrix, nutrients)
+        distance = (np.maximum(self.lower - shares, 0) + np.maximum(shares - self.upper, 0)).sum(axis=1)
+        return np.where(known, np.clip(1 - distance, 0, 1), 1.0)
+
+    def mask(self, df, filter_index):
+        """Rows of df meeting every share bound and the tag rule; filter_index is df's FilterIndex"""
+        matrix = np.column_stack([
+            pd.to_numeric(df[macro], errors='coerce').to_numpy(dtype=float)
+            if macro in df.columns else np.zeros(len(df))
+            for macro in MACROS
+        ])
+        keep = self.fit(np.nan_to_num(matrix)) >= 1
+        if self.any_tags:
+            keep &= filter_index.mask(preferences=self.any_tags, match_any=True)
+        return keep
+
+
+def load_diet_rules(path=DIET_RULES_PATH):
+    """Compile every diet in a rules file, keyed by the name shown in the diet selector"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            rules = json.load(f)
+        return {name: DietRule(name, rule) for name, rule in rules.items()}
+    except Exception as e:
+        print(f"Error loading diet rules: {e}")
+        return {}
+
+
+_rules = None
+_rules_lock = threading.Lock()
+
+
+def get_diet_rules():
+    """Every compiled diet, in the order of the rules file, loaded on first use"""
+    global _rules
+    if _rules is None:
+        with _rules_lock:
+            if _rules is None:
+                _rules = load_diet_rules()
+    return _rules
+
+
+def get_diet(diet_type):
+    """The compiled rule for a diet, or None when no diet is selected or it is unknown"""
+    if diet_type in NO_DIET:
+        return None
+    return get_diet_rules().get(diet_type)
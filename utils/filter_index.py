@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+
+# Tag values that mean "no tags"
+EMPTY_TAGS = {'', 'none', 'n/a', 'nan'}
+
+
+def normalize_tag(tag):
+    """Lower-case a tag and drop hyphens and spaces so 'Low-Fat', 'low-fat' and 'lowfat' all match"""
+    return str(tag).strip().lower().replace('-', '').replace(' ', '')
+
+
+def _encode_tags(values):
+    """Parse pipe-separated tag strings into bitmask words, the tag vocabulary and a missing-value mask"""
+    categories = pd.Categorical(values)
+    vocab = {}
+    unique_masks = []
+    # Each distinct string is parsed once, then broadcast to its rows through the category codes
+    for text in categories.categories:
+        mask = 0
+        for tag in str(text).split('|'):
+            tag = normalize_tag(tag)
+            if tag in EMPTY_TAGS:
+                continue
+            mask |= 1 << vocab.setdefault(tag, len(vocab))
+        unique_masks.append(mask)
+
+    n_words = max(1, (len(vocab) + 63) // 64)
+    table = np.zeros((len(unique_masks) + 1, n_words), dtype=np.uint64)
+    for row, mask in enumerate(unique_masks):
+        for word in range(n_words):
+            table[row, word] = (mask >> (64 * word)) & 0xFFFFFFFFFFFFFFFF
+
+    # Code -1 (missing) maps to the trailing all-zero row
+    codes = np.asarray(categories.codes)
+    words = table[np.where(codes < 0, len(unique_masks), codes)]
+    return words, vocab, codes < 0
+
+
+class FilterIndex:
+    """Build-once index that answers cuisine, meal type, preference and allergen filters with bitwise ops"""
+
+    def __init__(self, df):
+        self.size = len(df)
+        self.dietary_words, self.dietary_vocab, _ = self._tags(df, 'dietary_info')
+        self.allergen_words, self.allergen_vocab, self.allergens_missing = self._tags(df, 'allergens')
+        self.cuisine_codes, self.cuisine_lookup = self._categories(df, 'cuisine_type')
+        self.meal_codes, self.meal_lookup = self._categories(df, 'meal_type')
+
+    def _tags(self, df, column):
+        if column not in df.columns:
+            return np.zeros((self.size, 1), dtype=np.uint64), {}, np.zeros(self.size, dtype=bool)
+        return _encode_tags(df[column])
+
+    def _categories(self, df, column):
+        if column not in df.columns:
+            return np.full(self.size, -1, dtype=np.int32), {}
+        categories = pd.Categorical(df[column])
+        lookup = {value: code for code, value in enumerate(categories.categories)}
+        return np.asarray(categories.codes, dtype=np.int32), lookup
+
+    @staticmethod
+    def _term_words(vocab, term, n_words):
+        """Bitmask of every tag containing term, mirroring the old substring matching"""
+        term = normalize_tag(term)
+        words = np.zeros(n_words, dtype=np.uint64)
+        for tag, bit in vocab.items():
+            if term in tag:
+                words[bit // 64] |= np.uint64(1 << (bit % 64))
+        return words
+
+    def mask(self, cuisine_type=None, meal_type=None, preferences=None, allergens=None, match_any=False):
+        """Boolean row mask for the filters; match_any keeps rows matching any preference instead of all"""
+        keep = np.ones(self.size, dtype=bool)
+
+        if cuisine_type and cuisine_type != "All":
+            keep &= self.cuisine_codes == self.cuisine_lookup.get(cuisine_type, -2)
+
+        if meal_type and meal_type != "All":
+            keep &= self.meal_codes == self.meal_lookup.get(meal_type, -2)
+
+        if preferences:
+            n_words = self.dietary_words.shape[1]
+            pref_words = [self._term_words(self.dietary_vocab, pref, n_words) for pref in preferences]
+            if match_any:
+                combined = np.bitwise_or.reduce(pref_words)
+                keep &= (self.dietary_words & combined).any(axis=1)
+            else:
+                # Preferences that map to a single tag are checked together in one pass
+                single = [w for w in pref_words if sum(bin(int(x)).count('1') for x in w) == 1]
+                if single:
+                    required = np.bitwise_or.reduce(single)
+                    keep &= ((self.dietary_words & required) == required).all(axis=1)
+                for words in pref_words:
+                    if not any(words is w for w in single):
+                        keep &= (self.dietary_words & words).any(axis=1)
+
+        if allergens:
+            n_words = self.allergen_words.shape[1]
+            forbidden = np.bitwise_or.reduce(
+                [self._term_words(self.allergen_vocab, allergen, n_words) for allergen in allergens])
+            # Rows with unknown allergens are excluded, as before
+            keep &= ~(self.allergen_words & forbidden).any(axis=1) & ~self.allergens_missing
+
+        return keep
+
+    def positions(self, *args, **kwargs):
+        """Row positions passing the filters; same arguments as mask()"""
+        return np.flatnonzero(self.mask(*args, **kwargs))
@@ -0,0 +1,112 @@
+import re
+import numpy as np
+
+# Ingredients assumed to be in every kitchen
+PANTRY_STAPLES = {'salt', 'pepper', 'water', 'spice', 'herb'}
+
+
+def _singular(word):
+    if len(word) > 4 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    if len(word) > 4 and word.endswith('oes'):
+        return word[:-2]
+    if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+def normalize_ingredient(text):
+    """Lower-case, singular form of an ingredient name without punctuation or quantities"""
+    words = re.findall(r"[a-z]+", str(text).lower())
+    return ' '.join(_singular(word) for word in words)
+
+
+def parse_ingredients(ingredients):
+    """Split a list or free-text enumeration of ingredients into normalized names"""
+    if isinstance(ingredients, str):
+        ingredients = re.split(r",|\||;|\n|\band\b", ingredients)
+    names = [normalize_ingredient(item) for item in ingredients]
+    return [name for name in names if name]
+
+
+def _popcount(words):
+    """Number of set bits in each row of a uint64 word matrix"""
+    return np.unpackbits(np.ascontiguousarray(words).view(np.uint8), axis=1).sum(axis=1)
+
+
+class IngredientIndex:
+    """Inverted index from normalized ingredient to recipes, with per-recipe ingredient bitsets"""
+
+    def __init__(self, df):
+        self.size = len(df)
+        self.vocab = {}
+        recipe_terms = []
+        values = df['ingredients'].tolist() if 'ingredients' in df.columns else [''] * self.size
+        for value in values:
+            terms = set() if value is None or value != value else set(parse_ingredients(str(value).split('|')))
+            recipe_terms.append({self.vocab.setdefault(term, len(self.vocab)) for term in terms})
+
+        self.terms = list(self.vocab)
+        self.term_words = [set(term.split()) for term in self.terms]
+        n_words = max(1, (len(self.vocab) + 63) // 64)
+        self.bitsets = np.zeros((self.size, n_words), dtype=np.uint64)
+        postings = [[] for _ in self.terms]
+        for recipe, term_ids in enumerate(recipe_terms):
+            for term_id in term_ids:
+                self.bitsets[recipe, term_id // 64] |= np.uint64(1 << (term_id % 64))
+                postings[term_id].append(recipe)
+        self.postings = [np.asarray(recipes, dtype=np.int32) for recipes in postings]
+        self.needed = _popcount(self.bitsets)
+
+    def _available_terms(self, ingredients, assume_staples):
+        """Index terms covered by the given ingredients ('salmon' covers 'salmon fillet' and vice versa).
+
+        Pantry staples only cover themselves, so 'pepper' does not cover 'bell pepper'.
+        """
+        available_words = [set(name.split()) for name in parse_ingredients(ingredients)]
+        return [term_id for term_id, (term, words) in enumerate(zip(self.terms, self.term_words))
+                if (assume_staples and term in PANTRY_STAPLES)
+                or any(words <= have or have <= words for have in available_words)]
+
+    def match(self, ingredients, limit=5, min_coverage=0.0, assume_staples=True):
+        """Recipes ranked by the share of their ingredients covered, then by how few are missing.
+
+        Returns (positions, coverage, missing) arrays, best first.
+        """
+        term_ids = self._available_terms(ingredients, assume_staples)
+        empty = np.array([], dtype=np.int32)
+        if not term_ids:
+            return empty, np.array([]), empty
+
+        # Only recipes sharing at least one ingredient are candidates
+        candidates = np.unique(np.concatenate([self.postings[term_id] for term_id in term_ids]))
+        query = np.zeros(self.bitsets.shape[1], dtype=np.uint64)
+        for term_id in term_ids:
+            query[term_id // 64] |= np.uint64(1 << (term_id % 64))
+
+        needed = self.needed[candidates]
+        have = _popcount(self.bitsets[candidates] & query)
+        coverage = have / np.maximum(needed, 1)
+        missing = needed - have
+
+        keep = coverage >= min_coverage
+        candidates, coverage, missing = candidates[keep], coverage[keep], missing[keep]
+        order = np.lexsort((missing, -coverage))[:limit]
+        return candidates[order], coverage[order], missing[order]
+
+    def missing_ingredients(self, position, ingredients, assume_staples=True):
+        """Names of the ingredients a recipe needs that are not covered"""
+        covered = set(self._available_terms(ingredients, assume_staples))
+        words = self.bitsets[position]
+        return [term for term_id, term in enumerate(self.terms)
+                if int(words[term_id // 64]) >> (term_id % 64) & 1 and term_id not in covered]
+
+    def find_recipes(self, df, ingredients, limit=5, min_coverage=0.0, assume_staples=True):
+        """Matching rows of df (the frame the index was built from) with coverage and missing columns"""
+        positions, coverage, missing = self.match(ingredients, limit, min_coverage, assume_staples)
+        result = df.iloc[positions].copy()
+        result['coverage'] = coverage
+        result['missing_count'] = missing
+        result['missing_ingredients'] = [self.missing_ingredients(p, ingredients, assume_staples)
+                                         for p in positions]
+        return result
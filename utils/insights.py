@@ -0,0 +1,103 @@
+import json
+import os
+import threading
+from utils.llm_cache import make_key
+from utils.catalog import CATALOG_DIR
+from utils.openai_helper import explain_food, analyze_recipe
+
+# Insights generated offline for catalog items, one {"key", "text"} JSON object per line
+INSIGHTS_PATH = os.getenv("INSIGHTS_PATH", os.path.join(CATALOG_DIR, 'insights.jsonl'))
+
+_precomputed = {'mtime': None, 'insights': {}}
+_precomputed_lock = threading.Lock()
+
+
+def read_insights(path=INSIGHTS_PATH):
+    """Insights stored at path by key; later lines win and unreadable lines are skipped"""
+    insights = {}
+    if not os.path.exists(path):
+        return insights
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+                insights[entry['key']] = entry['text']
+            except (ValueError, KeyError, TypeError):
+                continue
+    return insights
+
+
+def precomputed_insights():
+    """The stored insights, reread only when the file changes"""
+    try:
+        mtime = os.path.getmtime(INSIGHTS_PATH)
+    except OSError:
+        return {}
+    if mtime != _precomputed['mtime']:
+        with _precomputed_lock:
+            if mtime != _precomputed['mtime']:
+                _precomputed['insights'] = read_insights()
+                _precomputed['mtime'] = mtime
+    return _precomputed['insights']
+
+
+def _stored(key, stream):
+    text = precomputed_insights().get(key)
+    if not text:
+        return None
+    return iter([text]) if stream else text
+
+
+def food_nutritional_info(food):
+    """Build the nutritional text used for food analysis"""
+    return f"""
+        - Calories: {food['calories']}
+        - Protein: {food['protein']}g
+        - Carbs: {food['carbs']}g
+        - Fat: {food['fat']}g
+        """
+
+
+def food_insight_key(food):
+    """Content key for a food's insight; changes only when the food itself changes"""
+    return make_key('food', str(food['name']), food_nutritional_info(food),
+                    str(food['description']) if 'description' in food else "")
+
+
+def recipe_insight_key(recipe):
+    """Content key for a recipe's analysis; changes only when the recipe itself changes"""
+    return make_key('recipe', str(recipe['name']), str(recipe['ingredients']), str(recipe['instructions']))
+
+
+def get_food_insight(food, refresh=False, stream=False):
+    """Generate the insight text for a food, or an iterator of its chunks when streaming.
+
+    Precomputed insights are served without calling the API unless refresh is set.
+    """
+    stored = None if refresh else _stored(food_insight_key(food), stream)
+    if stored is not None:
+        return stored
+    return explain_food(
+        food['name'],
+        food_nutritional_info(food),
+        food['description'] if 'description' in food else "",
+        refresh=refresh,
+        stream=stream
+    )
+
+
+def get_recipe_insight(recipe, refresh=False, stream=False):
+    """Generate the analysis text for a recipe, or an iterator of its chunks when streaming.
+
+    Precomputed analyses are served without calling the API unless refresh is set.
+    """
+    stored = None if refresh else _stored(recipe_insight_key(recipe), stream)
+    if stored is not None:
+        return stored
+    return analyze_recipe(
+        recipe['name'],
+        recipe['ingredients'],
+        recipe['instructions'],
+        refresh=refresh,
+        stream=stream
+    )
@@ -0,0 +1,255 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from utils.llm_cache import CACHE_DIR
+
+# Where logged meals are kept between sessions
+INTAKE_DB_PATH = os.getenv("INTAKE_DB_PATH", os.path.join(CACHE_DIR, "intake.sqlite3"))
+
+# Nutrients tracked per entry, in the column order of the stored arrays
+NUTRIENTS = ['protein', 'carbs', 'fat', 'calories']
+
+# User the Streamlit app logs meals for until profiles exist
+DEFAULT_USER = "local"
+
+# Initial capacity of a user's entry arrays; they double when full
+INITIAL_CAPACITY = 64
+
+
+def day_of(timestamp):
+    """The local calendar day of a timestamp, as YYYY-MM-DD"""
+    return time.strftime('%Y-%m-%d', time.localtime(timestamp))
+
+
+def day_bounds(day):
+    """Timestamps of the start of a local day and of the next one"""
+    start = datetime.strptime(day, '%Y-%m-%d')
+    return start.timestamp(), (start + timedelta(days=1)).timestamp()
+
+
+class IntakeEntry:
+    """One logged food; also readable as a dict of its nutrients"""
+    __slots__ = ('name', 'eaten_at', 'protein', 'carbs', 'fat', 'calories')
+
+    def __init__(self, name, eaten_at, protein=0.0, carbs=0.0, fat=0.0, calories=0.0):
+        self.name = name
+        self.eaten_at = eaten_at
+        self.protein = protein
+        self.carbs = carbs
+        self.fat = fat
+        self.calories = calories
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+
+class _UserLog:
+    """A user's entries as parallel arrays in time order, with prefix sums for window totals"""
+    __slots__ = ('size', 'times', 'values', 'cumulative', 'names', 'day_totals', 'day_counts')
+
+    def __init__(self):
+        self.size = 0
+        self.times = np.empty(INITIAL_CAPACITY)
+        self.values = np.empty((INITIAL_CAPACITY, len(NUTRIENTS)))
+        # cumulative[i] is the sum of the first i entries
+        self.cumulative = np.zeros((INITIAL_CAPACITY + 1, len(NUTRIENTS)))
+        self.names = []
+        self.day_totals = {}
+        self.day_counts = {}
+
+    def _grow(self):
+        capacity = len(self.times) * 2
+        self.times = np.resize(self.times, capacity)
+        self.values = np.resize(self.values, (capacity, len(NUTRIENTS)))
+        cumulative = np.zeros((capacity + 1, len(NUTRIENTS)))
+        cumulative[:self.size + 1] = self.cumulative[:self.size + 1]
+        self.cumulative = cumulative
+
+    def add(self, name, eaten_at, values):
+        if self.size == len(self.times):
+            self._grow()
+        # Entries normally arrive in time order; a backdated one shifts the later entries
+        position = self.size if self.size == 0 or eaten_at >= self.times[self.size - 1] \
+            else int(np.searchsorted(self.times[:self.size], eaten_at, side='right'))
+        self.times[position + 1:self.size + 1] = self.times[position:self.size]
+        self.values[position + 1:self.size + 1] = self.values[position:self.size]
+        self.times[position] = eaten_at
+        self.values[position] = values
+        self.names.insert(position, name)
+        self.size += 1
+        self.cumulative[position + 1:self.size + 1] = self.cumulative[position] + \
+            np.cumsum(self.values[position:self.size], axis=0)
+
+        day = day_of(eaten_at)
+        self.day_totals[day] = self.day_totals.get(day, np.zeros(len(NUTRIENTS))) + values
+        self.day_counts[day] = self.day_counts.get(day, 0) + 1
+
+    def span(self, start, end):
+        """Positions of the entries with start <= eaten_at < end"""
+        times = self.times[:self.size]
+        return int(np.searchsorted(times, start)), int(np.searchsorted(times, end))
+
+    def remove(self, first, last):
+        """Drop the entries at positions first..last-1"""
+        if first >= last:
+            return
+        for position in range(first, last):
+            day = day_of(self.times[position])
+            self.day_totals[day] = self.day_totals[day] - self.values[position]
+            self.day_counts[day] -= 1
+            if not self.day_counts[day]:
+                del self.day_totals[day], self.day_counts[day]
+        count = last - first
+        self.times[first:self.size - count] = self.times[last:self.size]
+        self.values[first:self.size - count] = self.values[last:self.size]
+        del self.names[first:last]
+        self.size -= count
+        self.cumulative[first + 1:self.size + 1] = self.cumulative[first] + \
+            np.cumsum(self.values[first:self.size], axis=0)
+
+
+class IntakeLedger:
+    """Meals logged per user with constant-time running totals per day, persisted to SQLite.
+
+    Each user's log is read from disk once, on first use; after that every
+    add updates the day's totals in place and window totals come from
+    prefix sums, so neither grows more expensive as the log grows.
+    """
+
+    def __init__(self, path=INTAKE_DB_PATH):
+        self.path = path
+        self._logs = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS intake (
+                                user TEXT NOT NULL,
+                                eaten_at REAL NOT NULL,
+                                name TEXT NOT NULL,
+                                protein REAL NOT NULL,
+                                carbs REAL NOT NULL,
+                                fat REAL NOT NULL,
+                                calories REAL NOT NULL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS intake_user_time ON intake (user, eaten_at)")
+
+    def _connect(self):
+        """One connection per thread; WAL lets readers and a writer work at the same time"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _log(self, user):
+        """The user's in-memory log, loaded from disk on first use; call with the lock held"""
+        log = self._logs.get(user)
+        if log is None:
+            log = _UserLog()
+            rows = self._connect().execute(
+                "SELECT name, eaten_at, protein, carbs, fat, calories FROM intake WHERE user = ? ORDER BY eaten_at",
+                (user,))
+            for name, eaten_at, *values in rows:
+                log.add(name, eaten_at, np.array(values, dtype=float))
+            self._logs[user] = log
+        return log
+
+    def add(self, user, name, protein=0.0, carbs=0.0, fat=0.0, calories=0.0, eaten_at=None):
+        """Log a food for a user, now unless eaten_at (a timestamp) is given"""
+        eaten_at = time.time() if eaten_at is None else float(eaten_at)
+        values = np.array([protein, carbs, fat, calories], dtype=float)
+        with self._lock:
+            # Load the log before writing so the new row is not read back in as well
+            log = self._log(user)
+            with self._connect() as conn:
+                conn.execute("INSERT INTO intake VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             (user, eaten_at, name, *values.tolist()))
+            log.add(name, eaten_at, values)
+        return IntakeEntry(name, eaten_at, *values.tolist())
+
+    def totals(self, user, day=None):
+        """Nutrients consumed on a day (YYYY-MM-DD, default today), in calculate_consumed_nutrients' format"""
+        with self._lock:
+            values = self._log(user).day_totals.get(day or day_of(time.time()))
+        if values is None:
+            return {nutrient: 0 for nutrient in NUTRIENTS}
+        return {nutrient: round(float(value), 1) for nutrient, value in zip(NUTRIENTS, values)}
+
+    def window_totals(self, user, days=7, end=None):
+        """Nutrients consumed in the days before end (a timestamp, default now)"""
+        end = time.time() if end is None else end
+        with self._lock:
+            log = self._log(user)
+            first, last = log.span(end - days * 86400, end)
+            values = log.cumulative[last] - log.cumulative[first]
+        return {nutrient: round(float(value), 1) for nutrient, value in zip(NUTRIENTS, values)}
+
+    def count(self, user, day=None):
+        """Number of entries logged on a day (default today)"""
+        with self._lock:
+            return self._log(user).day_counts.get(day or day_of(time.time()), 0)
+
+    def entries(self, user, start=None, end=None):
+        """Entries eaten between two timestamps, oldest first; the whole log by default"""
+        with self._lock:
+            log = self._log(user)
+            first, last = log.span(-np.inf if start is None else start, np.inf if end is None else end)
+            return [IntakeEntry(log.names[i], float(log.times[i]), *log.values[i].tolist())
+                    for i in range(first, last)]
+
+    def clear_day(self, user, day=None):
+        """Remove every entry logged on a day (default today)"""
+        start, end = day_bounds(day or day_of(time.time()))
+        with self._lock:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM intake WHERE user = ? AND eaten_at >= ? AND eaten_at < ?",
+                             (user, start, end))
+            log = self._log(user)
+            log.remove(*log.span(start, end))
+
+    def day(self, user, day=None):
+        """A day's intake, usable wherever a recent_foods list is expected"""
+        return IntakeDay(self, user, day or day_of(time.time()))
+
+
+class IntakeDay:
+    """One user's intake for one day; its totals come from the ledger without re-summing"""
+    __slots__ = ('ledger', 'user', 'day')
+
+    def __init__(self, ledger, user, day):
+        self.ledger = ledger
+        self.user = user
+        self.day = day
+
+    def totals(self):
+        return self.ledger.totals(self.user, self.day)
+
+    def __iter__(self):
+        return iter(self.ledger.entries(self.user, *day_bounds(self.day)))
+
+    def __len__(self):
+        return self.ledger.count(self.user, self.day)
+
+
+_ledger = None
+_ledger_lock = threading.Lock()
+
+
+def get_intake_ledger():
+    """The process-wide intake ledger, opened on first use"""
+    global _ledger
+    if _ledger is None:
+        with _ledger_lock:
+            if _ledger is None:
+                _ledger = IntakeLedger()
+    return _ledger
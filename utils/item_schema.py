@@ -0,0 +1,133 @@
+import json
+import re
+import pandas as pd
+from utils.json_stream import parse_partial_json
+
+# Fields of each generated item and their JSON types
+FOOD_SCHEMA = {
+    'name': 'string',
+    'description': 'string',
+    'cuisine_type': 'string',
+    'meal_type': 'string',
+    'calories': 'number',
+    'protein': 'number',
+    'carbs': 'number',
+    'fat': 'number',
+    'dietary_info': 'string',
+    'allergens': 'string'
+}
+RECIPE_SCHEMA = {
+    'name': 'string',
+    'cuisine_type': 'string',
+    'meal_type': 'string',
+    'ingredients': 'string',
+    'instructions': 'string',
+    'prep_time': 'number',
+    'cooking_time': 'number',
+    'dietary_info': 'string',
+    'allergens': 'string'
+}
+
+# Descriptions that tell the model how to fill fields whose format matters
+FIELD_DESCRIPTIONS = {
+    'calories': "kcal per serving",
+    'protein': "grams per serving",
+    'carbs': "grams per serving",
+    'fat': "grams per serving",
+    'ingredients': "pipe-separated list of ingredients",
+    'instructions': "pipe-separated list of steps",
+    'prep_time': "minutes",
+    'cooking_time': "minutes",
+    'dietary_info': "pipe-separated dietary labels",
+    'allergens': "pipe-separated allergens, or None"
+}
+
+_NUMBER = re.compile(r"-?(?:\d+(?:\.\d*)?|\.\d+)")
+# Thousands separators, as in "1,200 kcal"
+_THOUSANDS = re.compile(r"(?<=\d),(?=\d{3}(?!\d))")
+
+
+def object_schema(fields):
+    """JSON Schema of one item"""
+    return {
+        'type': 'object',
+        'properties': {field: {'type': kind, **({'description': FIELD_DESCRIPTIONS[field]}
+                                                if field in FIELD_DESCRIPTIONS else {})}
+                       for field, kind in fields.items()},
+        'required': list(fields)
+    }
+
+
+def items_function(name, description, lists):
+    """Function definition the model is made to call, with one array of items per key of lists.
+
+    lists maps an argument name to (fields, count).
+    """
+    return {
+        'name': name,
+        'description': description,
+        'parameters': {
+            'type': 'object',
+            'properties': {key: {'type': 'array', 'items': object_schema(fields),
+                                 'minItems': count, 'maxItems': count}
+                           for key, (fields, count) in lists.items()},
+            'required': list(lists)
+        }
+    }
+
+
+def repair_json(text):
+    """Parse JSON from a response that may be fenced, wrapped in prose or cut off; None if nothing parses"""
+    if not text:
+        return None
+    stripped = re.sub(r"^\s*```(?:json)?\s*|\s*```\s*$", "", text)
+    try:
+        return json.loads(stripped)
+    except ValueError:
+        # Keeps every complete value of a truncated response
+        return parse_partial_json(stripped)
+
+
+def to_number(value):
+    """Numeric value of a field such as 250, "250", "1,200 kcal", "20g" or ".5g"; NaN when there is none"""
+    if isinstance(value, bool):
+        return float('nan')
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _NUMBER.search(_THOUSANDS.sub('', str(value))) if value is not None else None
+    return float(match.group()) if match else float('nan')
+
+
+def to_text(value):
+    """Text value of a field, joining lists with '|' like the catalog; None when missing"""
+    if value is None:
+        return None
+    if isinstance(value, list):
+        return '|'.join(str(v).strip() for v in value)
+    return str(value).strip()
+
+
+def coerce_items(data, fields, count):
+    """Up to count named items from a parsed response, with every field coerced to its type"""
+    # Unwrap responses like {"items": [...]} when a list was asked for
+    if isinstance(data, dict) and 'name' not in data:
+        lists = [value for value in data.values() if isinstance(value, list)]
+        data = lists[0] if lists else data
+    items = [data] if isinstance(data, dict) else data if isinstance(data, list) else []
+
+    valid = []
+    for item in items:
+        if not isinstance(item, dict) or not item.get('name'):
+            continue
+        valid.append({field: to_number(item.get(field)) if kind == 'number' else to_text(item.get(field))
+                      for field, kind in fields.items()})
+    return valid[:count]
+
+
+def items_frame(items, fields):
+    """DataFrame of coerced items with float numeric columns, even when there are none"""
+    df = pd.DataFrame(items, columns=list(fields))
+    for field, kind in fields.items():
+        if kind == 'number':
+            df[field] = df[field].astype('float64')
+    return df
@@ -0,0 +1,70 @@
+import json
+import re
+
+# A number at the end of the text, which more digits may still extend
+_TRAILING_NUMBER = re.compile(r"-?[\d.]+(?:[eE][-+]?\d*)?\s*$|-\s*$")
+
+
+def _closers(stack):
+    """Text that closes every container still open on the stack"""
+    return ''.join(reversed(stack))
+
+
+def parse_partial_json(text):
+    """Parse the JSON value at the start of a possibly incomplete text.
+
+    Fields whose values are complete (and a string value that is still being
+    written) are returned; a trailing half-written key, literal or number is
+    dropped, since a number is only final once a ',', '}' or ']' follows it.
+    Returns None when no object or array has started yet.
+    """
+    starts = [i for i in (text.find('{'), text.find('[')) if i != -1]
+    if not starts:
+        return None
+    s = text[min(starts):]
+
+    stack = []
+    in_string = False
+    escape = False
+    # Prefixes that are known to be valid once the open containers are closed
+    safe_points = []
+    for i, ch in enumerate(s):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == '\\':
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+
+        if ch == '"':
+            in_string = True
+        elif ch in '{[':
+            stack.append('}' if ch == '{' else ']')
+            safe_points.append((i + 1, _closers(stack)))
+        elif ch in '}]':
+            if stack:
+                stack.pop()
+            if not stack:
+                # The value is complete; anything after it is ignored
+                try:
+                    return json.loads(s[:i + 1])
+                except ValueError:
+                    break
+            safe_points.append((i + 1, _closers(stack)))
+        elif ch == ',':
+            safe_points.append((i, _closers(stack)))
+
+    # Optimistic attempt: close the current string and every open container
+    head = s[:-1] if escape else s
+    candidates = []
+    if in_string or not _TRAILING_NUMBER.search(s):
+        candidates.append(head + ('"' if in_string else '') + _closers(stack))
+    candidates.extend(s[:end] + closers for end, closers in reversed(safe_points))
+    for candidate in candidates:
+        try:
+            return json.loads(candidate)
+        except ValueError:
+            continue
+    return None
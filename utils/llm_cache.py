@@ -0,0 +1,177 @@
+import atexit
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Directory for on-disk caches shared by the Streamlit workers and the API server
+CACHE_DIR = os.getenv("TASTY_CACHE_DIR", ".cache")
+
+# Hit and miss counts and access times are written in batches, at most this many seconds apart
+STATS_FLUSH_SECONDS = float(os.getenv("CACHE_STATS_FLUSH_SECONDS", "5"))
+
+# An entry's access time is only rewritten once it is this many seconds old; LRU order needs no finer
+ACCESS_RESOLUTION = 60.0
+
+
+def make_key(*parts):
+    """Hash the parts of a request into a stable content-addressed key"""
+    payload = json.dumps(parts, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """SQLite-backed cache with TTL and LRU eviction, safe to share between processes.
+
+    Lookups only read; their counters and access times are kept in memory
+    and written with the next set(), stats() or periodic flush, so hits do
+    not queue on the database's write lock.
+    """
+
+    def __init__(self, path, ttl=24 * 3600, max_bytes=100 * 1024 * 1024, max_entries=50000):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._pending_lock = threading.Lock()
+        self._hits, self._misses, self._accessed = 0, 0, {}
+        self._flushed = time.monotonic()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS entries (
+                                key TEXT PRIMARY KEY,
+                                value TEXT NOT NULL,
+                                size INTEGER NOT NULL,
+                                created REAL NOT NULL,
+                                accessed REAL NOT NULL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+            conn.execute("""CREATE TABLE IF NOT EXISTS counters (
+                                name TEXT PRIMARY KEY,
+                                value INTEGER NOT NULL)""")
+            conn.execute("INSERT OR IGNORE INTO counters VALUES ('hits', 0), ('misses', 0)")
+        atexit.register(self.flush)
+
+    def _connect(self):
+        """One connection per thread; WAL lets readers and a writer work at the same time"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key, count=True):
+        """Return the cached value for key, or None on a miss.
+
+        count=False peeks without touching the hit and miss counters or the
+        access time, for re-checks of a lookup that was already counted.
+        """
+        now = time.time()
+        row = self._connect().execute("SELECT value, created, accessed FROM entries WHERE key = ?",
+                                      (key,)).fetchone()
+        # Expired entries are left for the next set() to evict
+        hit = row is not None and (self.ttl is None or now - row[1] <= self.ttl)
+        if not count:
+            return json.loads(row[0]) if hit else None
+        with self._pending_lock:
+            if hit:
+                self._hits += 1
+                if now - row[2] > ACCESS_RESOLUTION:
+                    self._accessed[key] = now
+            else:
+                self._misses += 1
+            due = time.monotonic() - self._flushed >= STATS_FLUSH_SECONDS
+        if due:
+            self.flush()
+        return json.loads(row[0]) if hit else None
+
+    def _take_pending(self):
+        """The counts and access times gathered since the last flush, resetting them"""
+        with self._pending_lock:
+            pending = self._hits, self._misses, self._accessed
+            self._hits, self._misses, self._accessed = 0, 0, {}
+            self._flushed = time.monotonic()
+        return pending
+
+    def _write_pending(self, conn):
+        """Add the gathered counts and access times inside the caller's write transaction"""
+        hits, misses, accessed = self._take_pending()
+        if hits:
+            conn.execute("UPDATE counters SET value = value + ? WHERE name = 'hits'", (hits,))
+        if misses:
+            conn.execute("UPDATE counters SET value = value + ? WHERE name = 'misses'", (misses,))
+        if accessed:
+            conn.executemany("UPDATE entries SET accessed = MAX(accessed, ?) WHERE key = ?",
+                             [(when, key) for key, when in accessed.items()])
+
+    def flush(self):
+        """Write the batched hit and miss counts and access times"""
+        with self._pending_lock:
+            if not (self._hits or self._misses or self._accessed):
+                self._flushed = time.monotonic()
+                return
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self._write_pending(conn)
+
+    def set(self, key, value):
+        """Store a JSON-serializable value and evict entries over the size caps"""
+        now = time.time()
+        payload = json.dumps(value)
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                         (key, payload, len(payload), now, now))
+            # Eviction sees the latest access times
+            self._write_pending(conn)
+            self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        """Drop expired entries, then least recently used ones until under both caps"""
+        if self.ttl is not None:
+            conn.execute("DELETE FROM entries WHERE created < ?", (now - self.ttl,))
+        count, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        if count <= self.max_entries and size <= self.max_bytes:
+            return
+        freed, removed = 0, []
+        for key, entry_size in conn.execute("SELECT key, size FROM entries ORDER BY accessed"):
+            if count - len(removed) <= self.max_entries and size - freed <= self.max_bytes:
+                break
+            removed.append((key,))
+            freed += entry_size
+        conn.executemany("DELETE FROM entries WHERE key = ?", removed)
+
+    def delete(self, key):
+        """Remove a single entry"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def clear(self):
+        """Remove every entry and reset the counters"""
+        self._take_pending()
+        with self._connect() as conn:
+            conn.execute("DELETE FROM entries")
+            conn.execute("UPDATE counters SET value = 0")
+
+    def stats(self):
+        """Return hit/miss counters and current size across all processes"""
+        self.flush()
+        conn = self._connect()
+        counters = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+        count, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        lookups = counters.get('hits', 0) + counters.get('misses', 0)
+        return {
+            'hits': counters.get('hits', 0),
+            'misses': counters.get('misses', 0),
+            'hit_rate': counters.get('hits', 0) / lookups if lookups else 0.0,
+            'entries': count,
+            'bytes': size
+        }
@@ -0,0 +1,335 @@
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+
+# Request priorities, lower runs first
+PRIORITY_HIGH = 0     # recommendations and summaries the user is waiting on
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2      # per-card insights
+
+# HTTP statuses worth retrying: rate limited, overloaded or failing upstream
+RETRYABLE_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling the API while the circuit breaker is open"""
+
+
+class TokenBucket:
+    """Continuously refilled budget of capacity units per minute"""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self.rate = self.capacity / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """Seconds until amount can be taken (requests larger than the bucket wait for a full one)"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount):
+        self.level -= min(amount, self.capacity)
+
+    def give_back(self, amount):
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+
+
+class CircuitBreaker:
+    """Stop sending requests after repeated failures, then let one trial through after a cool-down"""
+
+    def __init__(self, failure_threshold=5, reset_after=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self._lock = threading.Lock()
+
+    def check(self):
+        """Raise CircuitOpenError unless a request may be sent now; True when the caller is the trial"""
+        with self._lock:
+            if self.opened_at is None:
+                return False
+            remaining = self.opened_at + self.reset_after - time.monotonic()
+            if remaining > 0 or self.trial_running:
+                raise CircuitOpenError(f"OpenAI requests paused after repeated failures; retry in {max(remaining, 1):.0f}s")
+            self.trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def abandon(self):
+        """Forget a trial that ended without an outcome, such as a cancelled request; only the trial may call this"""
+        with self._lock:
+            self.trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.trial_running or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.trial_running = False
+
+
+def _status_code(error):
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status
+
+
+def is_retryable(error):
+    """Whether an API error is transient: rate limits, server errors, timeouts and dropped connections"""
+    status = _status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUSES
+    name = type(error).__name__
+    return name in ('APIConnectionError', 'APITimeoutError') or isinstance(error, (ConnectionError, TimeoutError))
+
+
+def _retry_after(error):
+    """Server-requested delay in seconds, if the error carries a Retry-After header"""
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMScheduler:
+    """Admits API calls in priority order within requests- and tokens-per-minute budgets,
+    retrying transient failures with jittered exponential backoff behind a circuit breaker.
+
+    Calls run in the caller's thread; the scheduler only decides when each may start.
+    """
+
+    def __init__(self, rpm=200, tpm=40000, max_concurrency=8, max_retries=4,
+                 base_delay=1.0, max_delay=30.0, breaker=None):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker or CircuitBreaker()
+        self.active = 0
+        self._queue = []
+        self._order = itertools.count()
+        self._cond = threading.Condition()
+        # Wake-up callbacks of requests waiting on an event loop rather than on the condition
+        self._async_waiters = set()
+
+    def _admit(self, ticket, tokens):
+        """With the condition held: start ticket's request and return 0 if it may run now, else the
+        seconds until the budgets allow it, or None while it must wait for its turn or a slot"""
+        if self._queue[0] != ticket or self.active >= self.max_concurrency:
+            return None
+        wait = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+        if wait == 0:
+            heapq.heappop(self._queue)
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            self.active += 1
+        return wait
+
+    def _leave_queue(self, ticket):
+        """With the condition held: drop a request that gave up waiting"""
+        if ticket in self._queue:
+            self._queue.remove(ticket)
+            heapq.heapify(self._queue)
+
+    def _notify(self):
+        """With the condition held: let every waiting request re-check whether it can start"""
+        self._cond.notify_all()
+        for wake in list(self._async_waiters):
+            wake()
+
+    def _acquire(self, priority, tokens):
+        """Block until this request is first in line, a slot is free and the budgets allow it"""
+        ticket = (priority, next(self._order))
+        with self._cond:
+            heapq.heappush(self._queue, ticket)
+            try:
+                while True:
+                    wait = self._admit(ticket, tokens)
+                    if wait == 0:
+                        return
+                    self._cond.wait(wait)
+            except BaseException:
+                self._leave_queue(ticket)
+                raise
+            finally:
+                # Let the next request in line re-check whether it can start
+                self._notify()
+
+    def _release(self, reserved=0, used=None):
+        with self._cond:
+            self.active -= 1
+            if used is not None and used < reserved:
+                self.tokens.give_back(reserved - used)
+            self._notify()
+
+    def _backoff(self, attempt, error):
+        """Full-jitter exponential delay, never shorter than a server-requested Retry-After"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return max(delay, _retry_after(error) or 0)
+
+    def _start(self, fn, priority, tokens):
+        """Call fn() once admitted, retrying transient failures; returns with the slot still held"""
+        for attempt in range(self.max_retries + 1):
+            trial = self.breaker.check()
+            settled = False
+            try:
+                self._acquire(priority, tokens)
+                try:
+                    result = fn()
+                except BaseException:
+                    self._release()
+                    raise
+                self.breaker.record_success()
+                settled = True
+                return result
+            except Exception as e:
+                settled = True
+                if not is_retryable(e):
+                    # Neither a success nor an outage; a trial ends without deciding the breaker's state
+                    if trial:
+                        self.breaker.abandon()
+                    raise
+                self.breaker.record_failure()
+                if attempt == self.max_retries:
+                    raise
+                delay = self._backoff(attempt, e)
+            finally:
+                if trial and not settled:
+                    # Interrupted before any outcome; another request may run the trial
+                    self.breaker.abandon()
+            time.sleep(delay)
+
+    def run(self, fn, priority=PRIORITY_NORMAL, tokens=0, usage=None):
+        """Call fn() when scheduled and return its result.
+
+        tokens is the estimated prompt plus completion size reserved from the
+        tokens-per-minute budget; usage(result) may report the tokens actually
+        used so the unused part is returned.
+        """
+        result = self._start(fn, priority, tokens)
+        used = None
+        try:
+            used = usage(result) if usage else None
+        finally:
+            self._release(tokens, used)
+        return result
+
+    def stream(self, fn, priority=PRIORITY_NORMAL, tokens=0, usage=None):
+        """Call fn() when scheduled and yield from the stream it returns.
+
+        The slot and the token reservation are held until the stream is
+        exhausted or closed; usage() may then report the tokens actually used.
+        Only opening the stream is retried.
+        """
+        stream = self._start(fn, priority, tokens)
+        used = None
+        try:
+            yield from stream
+        finally:
+            try:
+                close = getattr(stream, 'close', None)
+                if close is not None:
+                    close()
+                used = usage() if usage else None
+            finally:
+                self._release(tokens, used)
+
+    async def _aacquire(self, priority, tokens):
+        """Async _acquire: waits on the event loop, woken by whichever thread frees a slot or budget"""
+        loop = asyncio.get_running_loop()
+        ticket = (priority, next(self._order))
+        woken = asyncio.Event()
+
+        def wake():
+            loop.call_soon_threadsafe(woken.set)
+
+        with self._cond:
+            heapq.heappush(self._queue, ticket)
+            self._async_waiters.add(wake)
+        admitted = False
+        try:
+            while True:
+                with self._cond:
+                    # Cleared under the lock, so a release after this check still wakes the waiter
+                    woken.clear()
+                    wait = self._admit(ticket, tokens)
+                    if wait == 0:
+                        admitted = True
+                        return
+                try:
+                    await asyncio.wait_for(woken.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            # Includes cancellation by the caller's timeout
+            with self._cond:
+                self._async_waiters.discard(wake)
+                if not admitted:
+                    self._leave_queue(ticket)
+                self._notify()
+
+    async def arun(self, coro_fn, priority=PRIORITY_NORMAL, tokens=0, usage=None):
+        """Async run(): awaits coro_fn() when scheduled, waiting for admission without blocking the event loop"""
+        for attempt in range(self.max_retries + 1):
+            trial = self.breaker.check()
+            settled = False
+            try:
+                await self._aacquire(priority, tokens)
+                used = None
+                try:
+                    result = await coro_fn()
+                    used = usage(result) if usage else None
+                except BaseException:
+                    # Includes cancellation by the caller's timeout
+                    self._release()
+                    raise
+                self._release(tokens, used)
+                self.breaker.record_success()
+                settled = True
+                return result
+            except Exception as e:
+                settled = True
+                if not is_retryable(e):
+                    if trial:
+                        self.breaker.abandon()
+                    raise
+                self.breaker.record_failure()
+                if attempt == self.max_retries:
+                    raise
+                delay = self._backoff(attempt, e)
+            finally:
+                if trial and not settled:
+                    self.breaker.abandon()
+            await asyncio.sleep(delay)
+
+
+def scheduler_from_env():
+    """Scheduler configured from LLM_RPM, LLM_TPM, LLM_MAX_CONCURRENCY and LLM_MAX_RETRIES"""
+    return LLMScheduler(rpm=int(os.getenv("LLM_RPM", "200")),
+                        tpm=int(os.getenv("LLM_TPM", "40000")),
+                        max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+                        max_retries=int(os.getenv("LLM_MAX_RETRIES", "4")))
@@ -0,0 +1,158 @@
+import numpy as np
+import pandas as pd
+from utils.data_loader import filter_items
+from utils.diet_rules import get_diet
+from utils.recommendation import SCORED_NUTRIENTS, TARGET_KEYS, nutrient_matrix
+
+# Relative importance of missing each target, in SCORED_NUTRIENTS order
+DEFAULT_WEIGHTS = {'protein': 1.0, 'carbs': 1.0, 'fat': 1.0, 'calories': 2.0}
+
+# Added to a plan's cost for each item already used by an earlier plan
+DIVERSITY_PENALTY = 0.15
+
+# Swap and drop passes of the local search before it stops
+MAX_SEARCH_PASSES = 20
+
+
+def plan_cost(totals, targets, weights):
+    """Weighted relative distance of nutrient totals (... x nutrients) from the targets"""
+    return np.abs(totals - targets) / targets @ weights
+
+
+def _greedy(matrix, targets, weights, penalty, max_items):
+    """Add the item that lowers the cost most until max_items or until nothing helps"""
+    chosen, totals, penalties = [], np.zeros(matrix.shape[1]), 0.0
+    cost = plan_cost(totals, targets, weights)
+    available = np.ones(len(matrix), dtype=bool)
+    for _ in range(max_items):
+        # Cost of adding each candidate, for all candidates at once
+        costs = plan_cost(totals + matrix, targets, weights) + penalties + penalty
+        costs[~available] = np.inf
+        best = int(np.argmin(costs))
+        if costs[best] >= cost:
+            break
+        chosen.append(best)
+        available[best] = False
+        totals = totals + matrix[best]
+        penalties += penalty[best]
+        cost = costs[best]
+    return chosen, totals, cost
+
+
+def _local_search(chosen, totals, cost, matrix, targets, weights, penalty):
+    """Improve a plan by swapping one item for any other, or dropping one, while that lowers the cost"""
+    available = np.ones(len(matrix), dtype=bool)
+    available[chosen] = False
+    for _ in range(MAX_SEARCH_PASSES):
+        best_move, best_cost = None, cost - 1e-9
+        penalties = penalty[chosen].sum()
+        for slot, item in enumerate(chosen):
+            without = totals - matrix[item]
+            others = penalties - penalty[item]
+            # Cost of every possible replacement for this slot in one pass
+            costs = plan_cost(without + matrix, targets, weights) + others + penalty
+            costs[~available] = np.inf
+            candidate = int(np.argmin(costs))
+            if costs[candidate] < best_cost:
+                best_move, best_cost = (slot, candidate), costs[candidate]
+            drop_cost = plan_cost(without, targets, weights) + others
+            if len(chosen) > 1 and drop_cost < best_cost:
+                best_move, best_cost = (slot, None), drop_cost
+        if best_move is None:
+            break
+        slot, candidate = best_move
+        item = chosen[slot]
+        available[item] = True
+        totals = totals - matrix[item]
+        if candidate is None:
+            chosen.pop(slot)
+        else:
+            chosen[slot] = candidate
+            available[candidate] = False
+            totals = totals + matrix[candidate]
+        cost = best_cost
+    return chosen, totals, cost
+
+
+def optimize_plans(matrix, targets, weights=None, n_plans=3, max_items=5):
+    """Choose up to n_plans distinct sets of rows of a nutrient matrix whose sums approach targets.
+
+    Each plan is built greedily and refined by local search; items used by
+    earlier plans carry a penalty so later plans differ. Returns a list of
+    (row positions, nutrient totals, cost), best first.
+    """
+    matrix = np.asarray(matrix, dtype=float)
+    targets = np.maximum(np.asarray(targets, dtype=float), 1e-6)
+    weights = np.ones(matrix.shape[1]) if weights is None else np.asarray(weights, dtype=float)
+    weights = weights / weights.sum()
+    usage = np.zeros(len(matrix))
+    plans, seen = [], set()
+    if len(matrix) == 0:
+        return plans
+
+    for _ in range(n_plans):
+        penalty = usage * DIVERSITY_PENALTY
+        chosen, totals, cost = _greedy(matrix, targets, weights, penalty, max_items)
+        if not chosen:
+            break
+        chosen, totals, cost = _local_search(chosen, totals, cost, matrix, targets, weights, penalty)
+        usage[chosen] += 1
+        key = frozenset(chosen)
+        if key in seen:
+            continue
+        seen.add(key)
+        plans.append((np.array(sorted(chosen)), totals, float(plan_cost(totals, targets, weights))))
+    return sorted(plans, key=lambda plan: plan[2])
+
+
+def _candidates(df, kind, cuisine_type, meal_type, preferences, allergens, diet_type):
+    """Rows of df allowed by the filters that have nutrition facts, with their nutrient matrix"""
+    if df is None or df.empty or not all(col in df.columns for col in ('calories', 'name')):
+        return None
+    rows = filter_items(df, cuisine_type, meal_type, preferences, allergens, diet_type=diet_type)
+    matrix = nutrient_matrix(rows)
+    # Items without calories cannot be planned with
+    keep = matrix[:, SCORED_NUTRIENTS.index('calories')] > 0
+    return rows[keep].assign(kind=kind), matrix[keep]
+
+
+def build_meal_plans(foods_df, recipes_df=None, targets=None, consumed=None, cuisine_type=None,
+                     meal_type=None, preferences=None, allergens=None, n_plans=3, max_items=5,
+                     weights=None, diet_type=None):
+    """Diverse sets of foods and recipes meeting the day's remaining calorie and macro targets.
+
+    targets is a calculate_daily_targets() result and consumed an optional
+    calculate_consumed_nutrients() result to subtract. Only items allowed
+    by diet_type's rules are used, and the diet's weights apply unless
+    weights is given. Returns a list of
+    dicts with the plan's 'items' frame, nutrient 'totals', the 'targets'
+    it aimed for and its 'cost' (0 is a perfect match).
+    """
+    filters = (cuisine_type, meal_type, preferences, allergens, diet_type)
+    pools = [pool for pool in (_candidates(foods_df, 'food', *filters), _candidates(recipes_df, 'recipe', *filters))
+             if pool is not None]
+    if not pools or targets is None:
+        return []
+    items = pd.concat([rows for rows, _ in pools], ignore_index=True)
+    matrix = np.vstack([matrix for _, matrix in pools])
+
+    goal = np.array([targets[TARGET_KEYS[nutrient]] for nutrient in SCORED_NUTRIENTS], dtype=float)
+    if consumed:
+        goal = goal - np.array([consumed.get(nutrient, 0) for nutrient in SCORED_NUTRIENTS], dtype=float)
+    if (goal <= 0).all():
+        return []
+    diet = get_diet(diet_type)
+    weights = weights or (diet.weights if diet is not None else None) or DEFAULT_WEIGHTS
+    weight_vector = np.array([weights.get(nutrient, 0) for nutrient in SCORED_NUTRIENTS], dtype=float)
+    # Targets already met are left out of the cost rather than pushed further
+    weight_vector = np.where(goal > 0, weight_vector, 0)
+
+    plans = []
+    for positions, totals, cost in optimize_plans(matrix, goal, weight_vector, n_plans, max_items):
+        plans.append({
+            'items': items.iloc[positions],
+            'totals': {nutrient: round(float(value), 1) for nutrient, value in zip(SCORED_NUTRIENTS, totals)},
+            'targets': {nutrient: round(float(value), 1) for nutrient, value in zip(SCORED_NUTRIENTS, np.maximum(goal, 0))},
+            'cost': cost
+        })
+    return plans
@@ -0,0 +1,167 @@
+import os
+import re
+import threading
+import numpy as np
+import pandas as pd
+from utils.search_index import SearchIndex, tokenize
+
+# Per-100 g nutrition table with a typical portion for each food
+NUTRITION_CSV = os.getenv("NUTRITION_CSV", os.path.join('data', 'nutrition.csv'))
+
+# Nutrients stored per 100 g, in column order
+NUTRIENTS = ['calories', 'protein', 'carbs', 'fat', 'fiber']
+
+# Column names in USDA FoodData Central style exports, per nutrient
+USDA_COLUMNS = {
+    'name': ['description', 'food', 'name'],
+    'calories': ['energy (kcal)', 'energy', 'calories'],
+    'protein': ['protein (g)', 'protein'],
+    'carbs': ['carbohydrate, by difference (g)', 'carbohydrate, by difference', 'carbohydrate', 'carbs'],
+    'fat': ['total lipid (fat) (g)', 'total lipid (fat)', 'fat'],
+    'fiber': ['fiber, total dietary (g)', 'fiber, total dietary', 'fiber'],
+    'portion_grams': ['portion_grams', 'gram_weight', 'serving size (g)'],
+    'portion': ['portion', 'portion_description', 'serving size']
+}
+
+# Grams per unit for units with a fixed weight or volume (volumes assume water density)
+UNIT_GRAMS = {
+    'g': 1, 'gram': 1, 'kg': 1000, 'oz': 28.35, 'ounce': 28.35, 'lb': 453.6, 'pound': 453.6,
+    'ml': 1, 'l': 1000, 'cup': 240, 'glass': 240, 'mug': 240, 'bowl': 300,
+    'tbsp': 15, 'tablespoon': 15, 'tsp': 5, 'teaspoon': 5
+}
+
+# Units that scale the food's own portion
+PORTION_SCALE = {'small': 0.75, 'medium': 1.0, 'large': 1.25, 'slice': 1.0, 'piece': 1.0,
+                 'serving': 1.0, 'portion': 1.0, 'whole': 1.0, 'fillet': 1.0, 'breast': 1.0}
+
+NUMBER_WORDS = {'a': 1, 'an': 1, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5,
+                'half': 0.5, 'quarter': 0.25}
+
+# Share of the query's words the matched food name must account for
+MIN_MATCH_SHARE = 0.6
+
+_QUANTITY = re.compile(r"^\s*(\d+(?:\.\d+)?(?:\s*/\s*\d+)?|(?:" + "|".join(NUMBER_WORDS) + r")\b)\s*", re.I)
+_UNIT = re.compile(r"^([a-z]+)\b\s*", re.I)
+_FILLER = re.compile(r"^(?:(?:an?|the|of)\s+)+", re.I)
+
+
+def _quantity_value(text):
+    text = text.strip().lower()
+    if text in NUMBER_WORDS:
+        return NUMBER_WORDS[text]
+    if '/' in text:
+        numerator, denominator = text.split('/')
+        return float(numerator) / float(denominator)
+    return float(text)
+
+
+def parse_portion(text):
+    """Split "2 slices of toast" into (quantity, unit, food); unit is None when not given"""
+    text = str(text).strip()
+    quantity = 1.0
+    match = _QUANTITY.match(text)
+    if match:
+        quantity = _quantity_value(match.group(1))
+        text = text[match.end():]
+    # "2 cups", "a glass of", "100g"; plurals are reduced to the unit's name
+    match = _UNIT.match(text)
+    if match:
+        word = match.group(1).lower()
+        for unit in (word, word[:-2] if word.endswith('es') else None, word[:-1] if word.endswith('s') else None):
+            if unit in UNIT_GRAMS or unit in PORTION_SCALE:
+                return quantity, unit, _FILLER.sub('', text[match.end():]).strip()
+    return quantity, None, _FILLER.sub('', text).strip()
+
+
+def import_usda_csv(source, dest=NUTRITION_CSV):
+    """Convert a USDA-style CSV with per-100 g nutrient columns into the local nutrition table"""
+    df = pd.read_csv(source)
+    lower = {col.strip().lower(): col for col in df.columns}
+    table = pd.DataFrame()
+    for field, candidates in USDA_COLUMNS.items():
+        column = next((lower[c] for c in candidates if c in lower), None)
+        if column is not None:
+            table[field] = df[column]
+    if 'name' not in table.columns or 'calories' not in table.columns:
+        raise ValueError("Expected at least a food description and an energy column")
+
+    table['name'] = table['name'].astype(str).str.strip().str.lower()
+    for field in NUTRIENTS + ['portion_grams']:
+        table[field] = pd.to_numeric(table.get(field), errors='coerce')
+    table['portion_grams'] = table['portion_grams'].fillna(100)
+    table['portion'] = table['portion'] if 'portion' in table.columns else '100 g'
+    table = table.dropna(subset=['calories']).drop_duplicates('name')
+    table[NUTRIENTS] = table[NUTRIENTS].fillna(0)
+    table[['name', 'portion', 'portion_grams'] + NUTRIENTS].to_csv(dest, index=False)
+    return len(table)
+
+
+class NutritionDB:
+    """Per-100 g nutrient table indexed for fuzzy food-name lookup"""
+
+    def __init__(self, df):
+        self.names = df['name'].astype(str).tolist()
+        self.portions = df['portion'].astype(str).tolist() if 'portion' in df.columns else ['100 g'] * len(df)
+        portion_grams = df['portion_grams'] if 'portion_grams' in df.columns else pd.Series(100, index=df.index)
+        self.portion_grams = pd.to_numeric(portion_grams, errors='coerce').fillna(100).to_numpy(dtype=np.float32)
+        self.values = df.reindex(columns=NUTRIENTS).apply(pd.to_numeric, errors='coerce') \
+            .fillna(0).to_numpy(dtype=np.float32)
+        self.index = SearchIndex(df[['name']].astype(str), {'name': 1.0})
+
+    @classmethod
+    def from_csv(cls, path=NUTRITION_CSV):
+        return cls(pd.read_csv(path) if os.path.exists(path) else pd.DataFrame(columns=['name'] + NUTRIENTS))
+
+    def match(self, food):
+        """Position of the food best matching a name, or None when nothing matches well enough"""
+        tokens = tokenize(food)
+        if not tokens:
+            return None
+        positions = self.index.search(food, limit=1)
+        if len(positions) == 0:
+            return None
+        best = positions[0]
+        # Every query word found in the name (exactly or with a typo) counts toward the match,
+        # as do portion words such as "slice" in "pizza slice"
+        matched = sum(1 for token in tokens
+                      if token in UNIT_GRAMS or token in PORTION_SCALE or self.index.scores(token)[best] > 0)
+        return best if matched / len(tokens) >= MIN_MATCH_SHARE else None
+
+    def grams(self, position, quantity, unit):
+        if unit in UNIT_GRAMS:
+            return quantity * UNIT_GRAMS[unit]
+        return quantity * PORTION_SCALE.get(unit, 1.0) * float(self.portion_grams[position])
+
+    def lookup(self, query):
+        """Nutrition for a portion such as "2 slices of toast", in get_nutritional_info's format, or None"""
+        quantity, unit, food = parse_portion(query)
+        position = self.match(food)
+        if position is None:
+            return None
+        grams = self.grams(position, quantity, unit)
+        values = self.values[position] * grams / 100
+        result = {nutrient: round(float(value), 1) for nutrient, value in zip(NUTRIENTS, values)}
+        result.update({'name': self.names[position], 'grams': round(grams, 1), 'source': 'local',
+                       'success': True})
+        return result
+
+
+_db = None
+_db_lock = threading.Lock()
+
+
+def get_nutrition_db():
+    """The process-wide nutrition table, loaded on first use"""
+    global _db
+    if _db is None:
+        with _db_lock:
+            if _db is None:
+                _db = NutritionDB.from_csv()
+    return _db
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) != 2:
+        sys.exit("usage: python -m utils.nutrition_db <usda_export.csv>")
+    print(f"Imported {import_usda_csv(sys.argv[1])} foods into {NUTRITION_CSV}")
@@ -1,91 +1,377 @@
 import os
-from openai import OpenAI
+import asyncio
+import queue
+import threading
+import weakref
+from contextlib import closing
+import httpx
+from openai import OpenAI, AsyncOpenAI
 import streamlit as st
-import pandas as pd
-import json
+from utils.llm_cache import CACHE_DIR, ResponseCache, make_key
+from utils.single_flight import SingleFlight
+from utils.llm_scheduler import PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW, scheduler_from_env
+from utils.json_stream import parse_partial_json
+from utils.item_schema import (FOOD_SCHEMA, RECIPE_SCHEMA, items_function, repair_json,
+                               coerce_items, items_frame)
+from utils.catalog import get_catalog
+import utils.prompts as prompts
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Initialize OpenAI client; the timeout bounds calls the pipeline has already given up on.
+# Retries are left to the scheduler, which backs off across all callers at once
+client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"),
+                timeout=float(os.getenv("OPENAI_TIMEOUT", "60")),
+                max_retries=0)
+
+# Rate limits, priorities and retries for every OpenAI request in this process
+scheduler = scheduler_from_env()
+
+# Completions cache shared by every Streamlit worker and the API server
+llm_cache = ResponseCache(
+    os.getenv("LLM_CACHE_PATH", os.path.join(CACHE_DIR, "llm_responses.sqlite3")),
+    ttl=int(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600))),
+    max_bytes=int(os.getenv("LLM_CACHE_MAX_MB", "100")) * 1024 * 1024)
+
+# Identical prompts already in flight are sent once; other callers wait for that response
+single_flight = SingleFlight(os.getenv("LLM_INFLIGHT_DIR", os.path.join(CACHE_DIR, "inflight")))
+
+# Per-event-loop map of in-flight async requests, keyed like the cache
+_async_inflight = weakref.WeakKeyDictionary()
+
+
+# Async client for the API server, created on first use
+_async_client = None
+MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "32"))
+
+
+def get_async_client():
+    """Pooled async OpenAI client shared by all of the API server's requests"""
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            timeout=float(os.getenv("OPENAI_TIMEOUT", "60")),
+            max_retries=0,
+            http_client=httpx.AsyncClient(limits=httpx.Limits(max_connections=MAX_CONNECTIONS,
+                                                              max_keepalive_connections=MAX_CONNECTIONS)))
+    return _async_client
+
+
+def _request_options(temperature, function=None):
+    """Optional request parameters, omitted when left at the API default.
+
+    With a function definition the model is made to call it, so its reply is
+    arguments matching the function's JSON schema rather than free text.
+    """
+    options = {} if temperature is None else {'temperature': temperature}
+    if function is not None:
+        options['tools'] = [{'type': 'function', 'function': function}]
+        options['tool_choice'] = {'type': 'function', 'function': {'name': function['name']}}
+    return options
+
+
+def _cache_key(model, messages, max_tokens, temperature, function=None):
+    if function is None:
+        return make_key(model, messages, max_tokens, temperature)
+    return make_key(model, messages, max_tokens, temperature, function)
+
+
+def _message_text(message, function=None):
+    """Reply text of a completion message, or the arguments of the forced function call"""
+    if function is None:
+        return message.content
+    calls = message.tool_calls or []
+    return calls[0].function.arguments if calls else message.content
+
+
+def _tools(function=None):
+    """The tools sent with a request, which count towards its prompt tokens"""
+    return _request_options(None, function).get('tools')
+
+
+def _estimate_tokens(messages, max_tokens, function=None):
+    """Prompt plus completion size reserved against the tokens-per-minute budget"""
+    return prompts.count_message_tokens(messages, _tools(function)) + max_tokens
+
+
+def _used_tokens(response):
+    usage = getattr(response, 'usage', None)
+    return getattr(usage, 'total_tokens', None)
+
+
+def _completion_tokens(response):
+    usage = getattr(response, 'usage', None)
+    return getattr(usage, 'completion_tokens', None)
+
+
+def chat_completion(messages, max_tokens, model="gpt-4", temperature=None, refresh=False,
+                    priority=PRIORITY_NORMAL, function=None):
+    """Return the completion text for messages, serving identical requests from the cache"""
+    key = _cache_key(model, messages, max_tokens, temperature, function)
+    if not refresh:
+        cached = llm_cache.get(key)
+        if cached is not None:
+            return cached
+
+    def fetch():
+        # Another process may have completed the same request while this one waited for the lock;
+        # the lookup was already counted above
+        if not refresh:
+            cached = llm_cache.get(key, count=False)
+            if cached is not None:
+                return cached
+        response = scheduler.run(
+            lambda: client.chat.completions.create(model=model,
+                                                   messages=messages,
+                                                   max_tokens=max_tokens,
+                                                   **_request_options(temperature, function)),
+            priority, _estimate_tokens(messages, max_tokens, function), _used_tokens)
+        content = _message_text(response.choices[0].message, function)
+        prompts.log_usage(model, messages, max_tokens, _completion_tokens(response), _tools(function))
+        if content is not None:
+            llm_cache.set(key, content)
+        return content
+
+    return single_flight.do(key, fetch)
+
+
+async def achat_completion(messages, max_tokens, model="gpt-4", temperature=None, refresh=False,
+                           priority=PRIORITY_NORMAL):
+    """Async chat_completion for the API server, sharing the same response cache"""
+    key = make_key(model, messages, max_tokens, temperature)
+    if not refresh:
+        cached = await asyncio.to_thread(llm_cache.get, key)
+        if cached is not None:
+            return cached
+
+    # Concurrent requests for the same prompt await one shared task; shield keeps a
+    # caller's timeout from cancelling the request for everyone else
+    inflight = _async_inflight.setdefault(asyncio.get_running_loop(), {})
+    task = inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_fetch_completion(key, messages, max_tokens, model, temperature,
+                                                    priority))
+        inflight[key] = task
+        task.add_done_callback(lambda _: inflight.pop(key, None))
+    return await asyncio.shield(task)
+
+
+async def _fetch_completion(key, messages, max_tokens, model, temperature, priority):
+    response = await scheduler.arun(
+        lambda: get_async_client().chat.completions.create(model=model,
+                                                           messages=messages,
+                                                           max_tokens=max_tokens,
+                                                           **_request_options(temperature)),
+        priority, _estimate_tokens(messages, max_tokens), _used_tokens)
+    content = response.choices[0].message.content
+    prompts.log_usage(model, messages, max_tokens, _completion_tokens(response))
+    if content is not None:
+        await asyncio.to_thread(llm_cache.set, key, content)
+    return content
+
+
+def stream_chat_completion(messages, max_tokens, model="gpt-4", temperature=None, refresh=False,
+                           priority=PRIORITY_NORMAL, function=None):
+    """Yield completion text (or forced function-call arguments) as it arrives;
+    cached responses are yielded in one piece"""
+    key = _cache_key(model, messages, max_tokens, temperature, function)
+    if not refresh:
+        cached = llm_cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+
+    # Callers asking for a prompt that is already streaming get the finished text in one piece
+    call, leader = single_flight.join(key)
+    if not leader:
+        content = call.wait()
+        if content:
+            yield content
+        return
+
+    # The response is read on a worker thread, so the cross-process lock is released as soon
+    # as the full text is cached rather than when the caller finishes consuming it
+    deltas, stop = queue.Queue(), threading.Event()
+    threading.Thread(target=_read_stream, daemon=True,
+                     args=(key, call, deltas, stop, messages, max_tokens, model, temperature, refresh,
+                           priority, function)).start()
+    try:
+        while True:
+            delta = deltas.get()
+            if delta is _STREAM_END:
+                return
+            if isinstance(delta, Exception):
+                raise delta
+            yield delta
+    finally:
+        stop.set()
+
+
+# Marks the end of the deltas a stream worker hands to its consumer
+_STREAM_END = object()
+
+
+def _read_stream(key, call, deltas, stop, messages, max_tokens, model, temperature, refresh, priority,
+                 function):
+    """Stream a completion into the deltas queue, caching and sharing it once complete"""
+    try:
+        with single_flight.process_lock(key):
+            cached = None if refresh else llm_cache.get(key, count=False)
+            if cached is not None:
+                call.finish(cached)
+                deltas.put(cached)
+                return
+
+            # Scheduled and retried until the response starts; a stream that breaks midway is not retried.
+            # The scheduler slot is held until the stream ends, then unused tokens are returned
+            parts = []
+            reserved = _estimate_tokens(messages, max_tokens, function)
+            stream = scheduler.stream(
+                lambda: client.chat.completions.create(model=model,
+                                                       messages=messages,
+                                                       max_tokens=max_tokens,
+                                                       stream=True,
+                                                       **_request_options(temperature, function)),
+                priority, reserved,
+                lambda: reserved - max_tokens + prompts.count_tokens("".join(parts)))
+            with closing(stream):
+                for chunk in stream:
+                    # Only complete streams are cached, so an abandoned stream is requested again next time
+                    if stop.is_set():
+                        return
+                    if not chunk.choices:
+                        continue
+                    delta = _delta_text(chunk.choices[0].delta, function)
+                    if delta:
+                        parts.append(delta)
+                        deltas.put(delta)
+            content = "".join(parts)
+            prompts.log_usage(model, messages, max_tokens, prompts.count_tokens(content), _tools(function))
+            if parts:
+                llm_cache.set(key, content)
+            call.finish(content or None)
+    except Exception as e:
+        call.fail(e)
+        deltas.put(e)
+    finally:
+        # A stream abandoned by its consumer fails the waiting callers here
+        single_flight.leave(key, call)
+        deltas.put(_STREAM_END)
+
+
+def _delta_text(delta, function=None):
+    if function is None:
+        return delta.content
+    calls = getattr(delta, 'tool_calls', None) or []
+    return calls[0].function.arguments if calls and calls[0].function else None
+
+
+def _stream_text(messages, max_tokens, error_message, refresh=False, priority=PRIORITY_NORMAL):
+    """Stream completion text, reporting errors like the blocking helpers do"""
+    try:
+        yield from stream_chat_completion(messages, max_tokens, refresh=refresh, priority=priority)
+    except Exception as e:
+        st.error(f"{error_message}: {str(e)}")
+
+
+def _stream_json(messages, max_tokens, on_partial, function, priority=PRIORITY_HIGH):
+    """Stream a function call's JSON arguments, passing each newly parsed list of items to on_partial"""
+    text, last = "", None
+    for chunk in stream_chat_completion(messages, max_tokens, priority=priority, function=function):
+        text += chunk
+        partial = parse_partial_json(text)
+        # Previews show the items, not the {"items": [...]} wrapper
+        if isinstance(partial, dict):
+            partial = partial.get('items', partial)
+        if partial and partial != last:
+            on_partial(partial)
+            last = partial
+    return text or None
+
+
+def _parse_items(content, fields, count):
+    """Items of a generated response as a typed DataFrame with the raw response attached"""
+    items = coerce_items(repair_json(content), fields, count)
+    if not items:
+        raise ValueError("Unexpected response format from OpenAI")
+    df = items_frame(items, fields)
+    df['raw_response'] = content
+    return df
 
 
 # Used in food analysis
-def explain_food(food_name, nutritional_info, description):
-    """Generate an explanation for food recommendation"""
+def explain_food(food_name, nutritional_info, description, refresh=False, stream=False):
+    """Generate an explanation for food recommendation; with stream=True returns an iterator of text chunks"""
     try:
-        prompt = f"""Analyze this food and provide insights:
-        Food: {food_name}
-        Nutritional Info: {nutritional_info}
-        Description: {description}
-
-        Please provide:
-        1. Health benefits
-        2. Who might benefit most from this food
-        3. Best times to consume
-
-        Format the response in markdown."""
-
-        response = client.chat.completions.create(model="gpt-4",
-                                                  messages=[{
-                                                      "role": "user",
-                                                      "content": prompt
-                                                  }],
-                                                  max_tokens=200)
-
-        return response.choices[0].message.content
+        prompt = prompts.render(prompts.FOOD_INSIGHT, name=food_name,
+                                nutrition=prompts.compact(nutritional_info).replace("\n", "; "),
+                                description=description)
+
+        messages = [{"role": "user", "content": prompt}]
+        if stream:
+            return _stream_text(messages, 200, "Error generating food explanation", refresh, PRIORITY_LOW)
+
+        content = chat_completion(messages, max_tokens=200, refresh=refresh, priority=PRIORITY_LOW)
+
+        return content
     except Exception as e:
         st.error(f"Error generating food explanation: {str(e)}")
         return None
 
 
 # Used to generate a recipe analysis
-def analyze_recipe(recipe_name, ingredients, instructions):
-    """Analyze a recipe using OpenAI to provide insights and tips"""
+def analyze_recipe(recipe_name, ingredients, instructions, refresh=False, stream=False):
+    """Analyze a recipe using OpenAI to provide insights and tips; with stream=True returns an iterator of text chunks"""
     try:
-        prompt = f"""Analyze this recipe and provide insights:
-        Recipe: {recipe_name}
-        Ingredients: {ingredients}
-        Instructions: {instructions}
-
-        Please provide:
-        1. Dietary considerations
-        2. Cooking tips
-        3. Possible variations
-
-        Format the response in markdown."""
-
-        response = client.chat.completions.create(model="gpt-4",
-                                                  messages=[{
-                                                      "role": "user",
-                                                      "content": prompt
-                                                  }],
-                                                  max_tokens=300)
-
-        return response.choices[0].message.content
+        prompt = prompts.render(prompts.RECIPE_INSIGHT, name=recipe_name,
+                                ingredients=ingredients, instructions=instructions)
+
+        messages = [{"role": "user", "content": prompt}]
+        if stream:
+            return _stream_text(messages, 300, "Error analyzing recipe", refresh, PRIORITY_LOW)
+
+        content = chat_completion(messages, max_tokens=300, refresh=refresh, priority=PRIORITY_LOW)
+
+        return content
     except Exception as e:
         st.error(f"Error analyzing recipe: {str(e)}")
         return None
 
 
-def suggest_recipes(ingredients):
-    """Suggest recipes based on available ingredients"""
+# Share of a recipe's ingredients that must be on hand for a local match to be used
+MIN_LOCAL_COVERAGE = 0.6
+
+
+def _format_local_recipes(matches):
+    """Markdown for recipes found in the local catalog"""
+    lines = ["### Recipes you can make"]
+    for i, (_, recipe) in enumerate(matches.iterrows(), 1):
+        missing = ", ".join(recipe['missing_ingredients']) or "nothing else"
+        steps = [step.strip() for step in str(recipe['instructions']).split('|') if step.strip()]
+        lines.append(f"{i}. **{recipe['name']}**")
+        lines.append(f"   - Additional ingredients needed: {missing}")
+        lines.append(f"   - Instructions: {' '.join(steps)}")
+        lines.append(f"   - Why: you already have {recipe['coverage']:.0%} of the ingredients")
+    return "\n".join(lines)
+
+
+def suggest_recipes(ingredients, use_catalog=True):
+    """Suggest recipes based on available ingredients, from the local catalog when it has good matches"""
+    if use_catalog:
+        try:
+            catalog = get_catalog('recipes')
+            matches = catalog.ingredient_index.find_recipes(catalog.frame, ingredients, limit=3,
+                                                            min_coverage=MIN_LOCAL_COVERAGE)
+            if not matches.empty:
+                return _format_local_recipes(matches)
+        except Exception as e:
+            print(f"Error searching local recipes: {e}")
+
     try:
-        prompt = f"""Given these ingredients: {ingredients}
-        Suggest 3 possible recipes that could be made, including:
-        1. Recipe name
-        2. Additional ingredients needed
-        3. Brief cooking instructions
-        4. Why this recipe would be a good choice
-
-        Format the response in markdown."""
-
-        response = client.chat.completions.create(model="gpt-4",
-                                                  messages=[{
-                                                      "role": "user",
-                                                      "content": prompt
-                                                  }],
-                                                  max_tokens=400)
-
-        return response.choices[0].message.content
+        prompt = prompts.render(prompts.RECIPE_SUGGESTIONS, ingredients=ingredients)
+
+        content = chat_completion([{"role": "user", "content": prompt}], max_tokens=400)
+
+        return content
     except Exception as e:
         st.error(f"Error suggesting recipes: {str(e)}")
         return None
@@ -96,289 +382,152 @@ def generate_food_recommendations(preferences,
                                   cuisine_type=None,
                                   meal_type=None,
                                   recent_foods=None,
-                                  custom_prompt=None):
-    """Generate food recommendations using OpenAI based on user preferences"""
+                                  custom_prompt=None,
+                                  on_partial=None,
+                                  count=1):
+    """Generate count food recommendations in one OpenAI call based on user preferences.
+
+    When on_partial is given the response is streamed and on_partial receives
+    the partially parsed items each time a new field arrives.
+    """
     try:
-        # Construct prefrence context
-        pref_context = ", ".join(
-            preferences) if preferences else "No specific preferences"
-        # Construct allergen context
-        allergen_context = ", ".join(
-            allergens) if allergens else "No specific allergens"
-        # Construct cuisine type context
-        cuisine_context = cuisine_type if cuisine_type and cuisine_type != "All" else "Any cuisine"
-        # Construct meal type context
-        meal_context = meal_type if meal_type and meal_type != "All" else "Any meal type"
-        # Construct the prompt combining food history and preferences
-        prompt = f"""As a nutritionist, considering the following anaysis of this user's food history:
-        {custom_prompt}
-
-        Please recommend ONE food based on the following requirements exactly:
-        Dietary Requirements (ALL MUST BE MET):
-        - {pref_context}
-        - Minimum protein content: 20g per serving if "High-Protein" is specified
-
-        Allergens to Avoid (MUST avoid these allergens): {allergen_context}
-
-        Preferred Cuisine: {cuisine_context}
-        Meal Type: {meal_context}
-
-        Please format your response as a single JSON object with detailed nutritional information including name, description, cuisine_type, meal_type, calories, protein, carbs, fat, dietary_info, and allergens.
-        """
-
-        response = client.chat.completions.create(model="gpt-4",
-                                                  messages=[{
-                                                      "role": "user",
-                                                      "content": prompt
-                                                  }],
-                                                  max_tokens=800)
-
-        # Parse JSON response
-        try:
-            recommendations_text = response.choices[0].message.content
-            if recommendations_text is None:
-                raise ValueError("Empty response from OpenAI")
-            data = json.loads(recommendations_text)
-
-            # Store the raw response text for display purposes
-            raw_response = recommendations_text
-
-            # Try to extract recommendations in various formats
-            # Convert single recommendation to DataFrame
-            if isinstance(data, dict):
-                df = pd.DataFrame([data])
-            elif isinstance(data, list) and len(data) > 0:
-                df = pd.DataFrame([data[0]])  # Take first item if list
-            else:
-                # Create a single row DataFrame with the name as the first key
-                # and the raw text in the description
-                df = pd.DataFrame([{
-                    'name': 'OpenAI Recommendation',
-                    'description': raw_response,
-                    'cuisine_type': 'N/A',
-                    'meal_type': 'N/A',
-                    'calories': 'N/A',
-                    'protein': 'N/A',
-                    'carbs': 'N/A',
-                    'fat': 'N/A',
-                    'dietary_info': 'N/A',
-                    'allergens': 'N/A',
-                    'raw_response': raw_response  # Store the raw response
-                }])
-
-            # Add raw_response column to DataFrame if it doesn't exist
-            if 'raw_response' not in df.columns:
-                df['raw_response'] = raw_response
-
-            return df
-
-        except Exception as e:
-            # If JSON parsing fails, return the raw text in a DataFrame
-            recommendations_text = response.choices[0].message.content
-            df = pd.DataFrame([{
-                'name': 'OpenAI Recommendation',
-                'description': recommendations_text,
-                'cuisine_type': 'N/A',
-                'meal_type': 'N/A',
-                'calories': 'N/A',
-                'protein': 'N/A',
-                'carbs': 'N/A',
-                'fat': 'N/A',
-                'dietary_info': 'N/A',
-                'allergens': 'N/A',
-                'raw_response': recommendations_text  # Store the raw response
-            }])
-            return df
+        # Construct how many items to ask for
+        item_request = "ONE food" if count == 1 else f"{count} different foods"
+        # Construct the prompt combining the history analysis and requirements
+        prompt = prompts.render(prompts.FOOD_RECOMMENDATIONS,
+                                history=prompts.history(custom_prompt),
+                                item_request=item_request,
+                                requirements=prompts.requirements(preferences, allergens, cuisine_type, meal_type))
+
+        messages = [{"role": "system", "content": prompts.NUTRITIONIST}, {"role": "user", "content": prompt}]
+        max_tokens = 400 + 400 * count
+        function = items_function('recommend_foods', "Return the recommended foods",
+                                  {'items': (FOOD_SCHEMA, count)})
+        if on_partial is None:
+            content = chat_completion(messages, max_tokens=max_tokens, priority=PRIORITY_HIGH, function=function)
+        else:
+            content = _stream_json(messages, max_tokens, on_partial, function)
+
+        # The schema keeps numeric fields numeric; fenced or truncated replies are repaired
+        return _parse_items(content, FOOD_SCHEMA, count)
 
     except Exception as e:
         st.error(f"Error generating food recommendations: {str(e)}")
-        return pd.DataFrame()
+        return items_frame([], FOOD_SCHEMA).assign(raw_response=None)
 
 
 def generate_recipe_recommendations(preferences,
                                     allergens,
                                     cuisine_type=None,
                                     meal_type=None,
-                                    custom_prompt=None):
-    """Generate recipe recommendations using OpenAI based on user preferences"""
+                                    custom_prompt=None,
+                                    on_partial=None,
+                                    count=1):
+    """Generate count recipe recommendations in one OpenAI call based on user preferences.
+
+    When on_partial is given the response is streamed and on_partial receives
+    the partially parsed items each time a new field arrives.
+    """
     try:
-        # Construct preference context
-        pref_context = ", ".join(
-            preferences) if preferences else "No specific preferences"
-        # Construct allergen context
-        allergen_context = ", ".join(
-            allergens) if allergens else "No specific allergens"
-        # Construct cuisine context
-        cuisine_context = cuisine_type if cuisine_type and cuisine_type != "All" else "Any cuisine"
-        # Construct meal type context
-        meal_context = meal_type if meal_type and meal_type != "All" else "Any meal type"
-        # Construct custom prompt context
-        prompt = f"""As a nutritionist, considering the following analysis of this user's food history: {custom_prompt}
-
-        Generate ONE recipe recommendation based on the following requriements:
-
-        Dietary Preferences(ALL MUST BE MET): {pref_context}
-        - Minimum protein content: 20g per serving if "High-Protein" is specified
-
-        Allergens to Avoid(Must avoid these allergens): {allergen_context}
-        Preferred Cuisine: {cuisine_context}
-        Meal Type: {meal_context}
-
-        For the recipe recommendation, provide:
-        1. Name
-        2. Cuisine type
-        3. Meal type
-        4. Ingredients (as a pipe-separated list)
-        5. Instructions (as a pipe-separated list of steps)
-        6. Prep time (in minutes)
-        7. Cooking time (in minutes)
-        8. Dietary information
-        9. Allergens (if any)
-
-        Format as a single JSON object containing the recipe details.
-        Example format:
-        {{
-          "name": "Recipe Name",
-          "cuisine_type": "Type",
-          "meal_type": "Type",
-          "ingredients": "Ingredient 1|Ingredient 2|Ingredient 3",
-          "instructions": "Step 1|Step 2|Step 3",
-          "prep_time": 15,
-          "cooking_time": 30,
-          "dietary_info": "info",
-          "allergens": "allergens if any"
-        }}"""
+        # Construct how many recipes to ask for
+        item_request = "ONE recipe" if count == 1 else f"{count} different recipes"
+        prompt = prompts.render(prompts.RECIPE_RECOMMENDATIONS,
+                                history=prompts.history(custom_prompt),
+                                item_request=item_request,
+                                requirements=prompts.requirements(preferences, allergens, cuisine_type, meal_type))
         # Generate recipe recommendations
-        response = client.chat.completions.create(
-            model="gpt-4",  # Latest model as of March 2024
-            messages=[{
-                "role": "user",
-                "content": prompt
-            }],
-            max_tokens=1000)
-
-        # Parse JSON response
-        try:
-            recommendations_text = response.choices[0].message.content
-            # st.write("Debug - Raw OpenAI Response:", recommendations_text)
-            data = json.loads(recommendations_text)
-
-            # Store the raw response text for display purposes
-            raw_response = recommendations_text
-
-            # Since we're asking for a single recipe, treat the data as a single recipe
-            if isinstance(data, dict):
-                df = pd.DataFrame([data])
-            else:
-                st.error("Unexpected response format from OpenAI")
-                # Create default format with raw response
-                default_recipe = {
-                    'name':
-                    'OpenAI Recipe Recommendation',
-                    'cuisine_type':
-                    cuisine_context
-                    if cuisine_context != "Any cuisine" else 'N/A',
-                    'meal_type':
-                    meal_context if meal_context != "Any meal type" else 'N/A',
-                    'ingredients':
-                    'See full response',
-                    'instructions':
-                    'See full response',
-                    'prep_time':
-                    0,
-                    'cooking_time':
-                    0,
-                    'dietary_info':
-                    pref_context
-                    if pref_context != "No specific preferences" else 'N/A',
-                    'allergens':
-                    allergen_context
-                    if allergen_context != "No specific allergens" else 'N/A',
-                    'raw_response':
-                    raw_response
-                }
-                df = pd.DataFrame([default_recipe])
-
-            # Add raw_response column to DataFrame if it doesn't exist
-            if 'raw_response' not in df.columns:
-                df['raw_response'] = raw_response
-
-            # Ensure all required columns exist
-            required_columns = [
-                'name', 'cuisine_type', 'meal_type', 'ingredients',
-                'instructions', 'prep_time', 'cooking_time', 'dietary_info',
-                'allergens'
-            ]
-
-            for col in required_columns:
-                if col not in df.columns:
-                    df[col] = 'N/A'
-
-            return df
+        messages = [{"role": "system", "content": prompts.NUTRITIONIST}, {"role": "user", "content": prompt}]
+        max_tokens = 400 + 600 * count
+        function = items_function('recommend_recipes', "Return the recommended recipes",
+                                  {'items': (RECIPE_SCHEMA, count)})
+        if on_partial is None:
+            content = chat_completion(messages, max_tokens=max_tokens, priority=PRIORITY_HIGH, function=function)
+        else:
+            content = _stream_json(messages, max_tokens, on_partial, function)
 
-        except Exception as e:
-            # If JSON parsing fails, return the raw text in a DataFrame
-            recommendations_text = response.choices[0].message.content
-            df = pd.DataFrame([{
-                'name':
-                'OpenAI Recipe Recommendation',
-                'cuisine_type':
-                cuisine_context if cuisine_context != "Any cuisine" else 'N/A',
-                'meal_type':
-                meal_context if meal_context != "Any meal type" else 'N/A',
-                'ingredients':
-                'See full response',
-                'instructions':
-                'See full response',
-                'prep_time':
-                0,
-                'cooking_time':
-                0,
-                'dietary_info':
-                pref_context
-                if pref_context != "No specific preferences" else 'N/A',
-                'allergens':
-                allergen_context
-                if allergen_context != "No specific allergens" else 'N/A',
-                'raw_response':
-                recommendations_text
-            }])
-            return df
+        return _parse_items(content, RECIPE_SCHEMA, count)
 
     except Exception as e:
         st.error(f"Error generating recipe recommendations: {str(e)}")
         # Return empty DataFrame with correct columns
-        return pd.DataFrame(columns=[
-            'name', 'cuisine_type', 'meal_type', 'ingredients', 'instructions',
-            'prep_time', 'cooking_time', 'dietary_info', 'allergens',
-            'raw_response'
-        ])
+        return items_frame([], RECIPE_SCHEMA).assign(raw_response=None)
 
 
-def generate_summary(food_history):
-    """Generate a summary of user's dietary preferences and history"""
+def generate_combined_recommendations(preferences,
+                                      allergens,
+                                      cuisine_type=None,
+                                      meal_type=None,
+                                      custom_prompt=None,
+                                      count=3):
+    """Generate count foods and count recipes together in one OpenAI call, returned as (foods_df, recipes_df)"""
     try:
-        if not food_history:
-            return "No dietary information provided."
+        prompt = prompts.render(prompts.COMBINED_RECOMMENDATIONS,
+                                history=prompts.history(custom_prompt),
+                                count=count,
+                                requirements=prompts.requirements(preferences, allergens, cuisine_type, meal_type))
+
+        function = items_function('recommend_foods_and_recipes', "Return the recommended foods and recipes",
+                                  {'foods': (FOOD_SCHEMA, count), 'recipes': (RECIPE_SCHEMA, count)})
+        messages = [{"role": "system", "content": prompts.NUTRITIONIST}, {"role": "user", "content": prompt}]
+        content = chat_completion(messages, max_tokens=400 + 1000 * count,
+                                  priority=PRIORITY_HIGH, function=function)
+        data = repair_json(content)
+        if not isinstance(data, dict):
+            raise ValueError("Unexpected response format from OpenAI")
+
+        foods_df = items_frame(coerce_items(data.get('foods', []), FOOD_SCHEMA, count), FOOD_SCHEMA)
+        recipes_df = items_frame(coerce_items(data.get('recipes', []), RECIPE_SCHEMA, count), RECIPE_SCHEMA)
+        foods_df['raw_response'] = content
+        recipes_df['raw_response'] = content
+        return foods_df, recipes_df
+
+    except Exception as e:
+        st.error(f"Error generating recommendations: {str(e)}")
+        return (items_frame([], FOOD_SCHEMA).assign(raw_response=None),
+                items_frame([], RECIPE_SCHEMA).assign(raw_response=None))
 
-        prompt = f"""Analyze this person's dietary profile and create a concise summary:
 
-        Recent Food History: {food_history}
+def rerank_items(food_history, names):
+    """Order candidate items by fit with the user's food history; returns positions into names or None"""
+    try:
+        numbered = "\n".join(f"{i}. {name}" for i, name in enumerate(names))
+        prompt = prompts.render(prompts.RERANK, history=prompts.history(food_history, keep='tail'),
+                                options=numbered)
+
+        messages = [{"role": "system", "content": prompts.NUTRITIONIST}, {"role": "user", "content": prompt}]
+        content = chat_completion(messages, max_tokens=100)
+        order = [i for i in repair_json(content) or [] if isinstance(i, int) and 0 <= i < len(names)]
+        # Options the model left out keep their retrieval order at the end
+        order = list(dict.fromkeys(order))
+        return order + [i for i in range(len(names)) if i not in order]
+    except Exception as e:
+        st.error(f"Error re-ranking recommendations: {str(e)}")
+        return None
 
-        Please provide a brief summary that captures:
-        1. Their eating patterns and preferences
-        2. Key nutritional considerations
 
-        Keep the summary professional and focused on relevant dietary insights."""
+def generate_summary(food_history, on_partial=None):
+    """Generate a summary of user's dietary preferences and history.
+
+    When on_partial is given the response is streamed and on_partial receives
+    the summary text written so far.
+    """
+    try:
+        if not food_history:
+            return "No dietary information provided."
+
+        # Long histories keep their most recent entries
+        prompt = prompts.render(prompts.SUMMARY, history=prompts.history(food_history, keep='tail'))
 
-        response = client.chat.completions.create(model="gpt-4",
-                                                  messages=[{
-                                                      "role": "user",
-                                                      "content": prompt
-                                                  }],
-                                                  max_tokens=250)
+        messages = [{"role": "user", "content": prompt}]
+        if on_partial is None:
+            content = chat_completion(messages, max_tokens=250, priority=PRIORITY_HIGH)
+        else:
+            content = ""
+            for chunk in stream_chat_completion(messages, 250, priority=PRIORITY_HIGH):
+                content += chunk
+                on_partial(content)
 
-        return response.choices[0].message.content
+        return content
     except Exception as e:
         st.error(f"Error generating dietary summary: {str(e)}")
         return "Unable to generate dietary summary."
@@ -0,0 +1,152 @@
+import threading
+import time
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import pandas as pd
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from utils.data_loader import load_food_data, load_recipe_data
+from utils.openai_helper import generate_summary
+
+# Worker pool shared by every session, so LLM round trips overlap instead of queueing
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="recommendations")
+
+# Seconds each call may take, measured from the moment the run starts
+DEFAULT_TIMEOUTS = {
+    'summary': 30,
+    'foods': 90,
+    'recipes': 90
+}
+
+# Values used when a call fails, times out or is cancelled
+FALLBACKS = {
+    'summary': "Unable to generate dietary summary.",
+    'foods': pd.DataFrame,
+    'recipes': pd.DataFrame
+}
+
+
+def _submit(fn, *args):
+    """Run fn on the shared pool, keeping the Streamlit script context so st.* calls still work"""
+    ctx = get_script_run_ctx()
+
+    def run():
+        if ctx is not None:
+            add_script_run_ctx(threading.current_thread(), ctx)
+        return fn(*args)
+
+    return _executor.submit(run)
+
+
+def _after(parent, fn, *args):
+    """Start fn(parent_result, *args) as soon as parent completes"""
+    child = Future()
+
+    def transfer(inner):
+        # The child stays pending until here so it can be cancelled at any time
+        if not child.set_running_or_notify_cancel():
+            return
+        if inner.cancelled():
+            child.cancel()
+        elif inner.exception() is not None:
+            child.set_exception(inner.exception())
+        else:
+            child.set_result(inner.result())
+
+    def start(done):
+        if child.cancelled():
+            return
+        try:
+            value = done.result()
+        except Exception:
+            value = None
+        inner = _submit(fn, value, *args)
+        child.add_done_callback(lambda c: inner.cancel() if c.cancelled() else None)
+        inner.add_done_callback(transfer)
+
+    parent.add_done_callback(start)
+    return child
+
+
+def start_recommendations(food_history, use_openai_only, preferences, allergens, cuisine_type, meal_type,
+                          on_partial=None, count=1):
+    """Start the summary, food and recipe calls and return their futures by name.
+
+    on_partial optionally maps call names to callbacks that receive streamed
+    partial results, so the page can show content before a call finishes.
+    count is the number of foods and recipes each generation call returns.
+    """
+    on_partial = on_partial or {}
+
+    if use_openai_only:
+        summary_future = _submit(generate_summary, food_history, on_partial.get('summary'))
+
+        # Food and recipe prompts need the summary, so they start the moment it arrives
+        def foods(summary):
+            return load_food_data(True, preferences, allergens, cuisine_type, meal_type,
+                                  None, summary or food_history, on_partial.get('foods'), count)
+
+        def recipes(summary):
+            return load_recipe_data(True, preferences, allergens, cuisine_type, meal_type,
+                                    summary or food_history, on_partial.get('recipes'), count)
+
+        foods_future = _after(summary_future, foods)
+        recipes_future = _after(summary_future, recipes)
+    else:
+        # Catalog recommendations are retrieved locally, so no LLM call is made at all
+        summary_future = Future()
+        summary_future.set_result("")
+        foods_future = _submit(load_food_data, False, preferences, allergens, cuisine_type, meal_type)
+        recipes_future = _submit(load_recipe_data, False, preferences, allergens, cuisine_type, meal_type)
+
+    return {
+        'summary': summary_future,
+        'foods': foods_future,
+        'recipes': recipes_future
+    }
+
+
+def cancel_recommendations(futures):
+    """Cancel every call of a run that has not finished yet"""
+    for future in futures.values():
+        future.cancel()
+
+
+def collect_recommendations(futures, timeouts=None, started_at=None):
+    """Wait for a run's results, replacing failed, timed out or cancelled calls with fallbacks"""
+    timeouts = {**DEFAULT_TIMEOUTS, **(timeouts or {})}
+    started_at = started_at if started_at is not None else time.monotonic()
+
+    results = {}
+    for name, future in futures.items():
+        remaining = max(0.0, started_at + timeouts[name] - time.monotonic())
+        try:
+            results[name] = future.result(timeout=remaining)
+        except FutureTimeoutError:
+            print(f"Recommendation call '{name}' timed out after {timeouts[name]}s")
+            future.cancel()
+            results[name] = None
+        except CancelledError:
+            results[name] = None
+        except Exception as e:
+            print(f"Recommendation call '{name}' failed: {e}")
+            results[name] = None
+
+        if results[name] is None:
+            fallback = FALLBACKS[name]
+            results[name] = fallback() if callable(fallback) else fallback
+
+    return results
+
+
+def run_recommendations(food_history, use_openai_only, preferences, allergens, cuisine_type, meal_type,
+                        timeouts=None, on_partial=None, count=1):
+    """Run the whole recommendation flow concurrently and return (summary, foods_df, recipes_df)"""
+    started_at = time.monotonic()
+    futures = start_recommendations(food_history, use_openai_only, preferences, allergens,
+                                    cuisine_type, meal_type, on_partial, count)
+    try:
+        results = collect_recommendations(futures, timeouts, started_at)
+    finally:
+        # Nothing that is still queued is needed anymore
+        cancel_recommendations(futures)
+    return results['summary'], results['foods'], results['recipes']
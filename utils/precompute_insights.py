@@ -0,0 +1,90 @@
+# Generates insights for every catalog item ahead of time: `python -m utils.precompute_insights`.
+# Items whose content key is already stored are skipped, so an interrupted run resumes
+# where it stopped and later runs only process new or changed items.
+import argparse
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from utils.catalog import load_catalog
+from utils.insights import (INSIGHTS_PATH, read_insights, food_insight_key, recipe_insight_key,
+                            food_nutritional_info)
+from utils.openai_helper import explain_food, analyze_recipe
+
+# Parallel API calls; the scheduler still enforces the account's rate limits
+DEFAULT_WORKERS = int(os.getenv("PRECOMPUTE_WORKERS", "4"))
+
+
+def _food_task(food):
+    return lambda: explain_food(food['name'], food_nutritional_info(food),
+                                food['description'] if 'description' in food else "")
+
+
+def _recipe_task(recipe):
+    return lambda: analyze_recipe(recipe['name'], recipe['ingredients'], recipe['instructions'])
+
+
+def pending_items(done):
+    """(key, generate) for every catalog item without a stored insight"""
+    tasks = {}
+    for kind, key_for, task_for in [('foods', food_insight_key, _food_task),
+                                    ('recipes', recipe_insight_key, _recipe_task)]:
+        for _, item in load_catalog(kind).iterrows():
+            key = key_for(item)
+            if key not in done and key not in tasks:
+                tasks[key] = task_for(item)
+    return tasks
+
+
+def live_keys():
+    """Content keys of every item currently in the catalogs"""
+    keys = set()
+    for kind, key_for in [('foods', food_insight_key), ('recipes', recipe_insight_key)]:
+        keys.update(key_for(item) for _, item in load_catalog(kind).iterrows())
+    return keys
+
+
+def prune(path=INSIGHTS_PATH):
+    """Rewrite the store without insights for items no longer in the catalogs"""
+    keys = live_keys()
+    insights = {key: text for key, text in read_insights(path).items() if key in keys}
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for key, text in insights.items():
+            f.write(json.dumps({'key': key, 'text': text}) + "\n")
+    os.replace(tmp_path, path)
+    return len(insights)
+
+
+def precompute(workers=DEFAULT_WORKERS, path=INSIGHTS_PATH):
+    """Generate and store missing insights; returns (generated, failed)"""
+    tasks = pending_items(read_insights(path))
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    generated, failed = 0, 0
+    with open(path, 'a', encoding='utf-8') as f, ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(generate): key for key, generate in tasks.items()}
+        for future in as_completed(futures):
+            try:
+                text = future.result()
+            except Exception as e:
+                print(f"Error generating insight {futures[future][:12]}: {e}")
+                text = None
+            if not text:
+                failed += 1
+                continue
+            # Each insight is written as soon as it arrives so a crash loses nothing done
+            f.write(json.dumps({'key': futures[future], 'text': text}) + "\n")
+            f.flush()
+            generated += 1
+    return generated, failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute insights for the food and recipe catalogs")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--prune', action='store_true', help="drop insights for items no longer in the catalogs")
+    args = parser.parse_args()
+
+    generated, failed = precompute(args.workers)
+    print(f"Generated {generated} insights, {failed} failed (rerun to retry)")
+    if args.prune:
+        print(f"Kept {prune()} insights")
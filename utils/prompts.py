@@ -0,0 +1,180 @@
+import json
+import logging
+import os
+import re
+
+try:
+    import tiktoken
+except ImportError:  # Token counts fall back to an estimate of four characters per token
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Tokens of user-supplied history or summary text included in a prompt
+HISTORY_TOKEN_BUDGET = int(os.getenv("PROMPT_HISTORY_TOKENS", "300"))
+
+# Tokens the chat format adds around each message
+MESSAGE_OVERHEAD = 4
+
+_encoding = None
+
+
+def _encoder():
+    global _encoding
+    if _encoding is None and tiktoken is not None:
+        _encoding = tiktoken.get_encoding("cl100k_base")
+    return _encoding
+
+
+def count_tokens(text):
+    """Number of gpt-4 tokens in text"""
+    text = str(text or "")
+    encoding = _encoder()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages, tools=None):
+    """Prompt tokens of a chat request, including the schema of any tools it sends"""
+    total = sum(count_tokens(message['content']) + MESSAGE_OVERHEAD for message in messages) + 2
+    if tools:
+        total += count_tokens(json.dumps(tools, separators=(',', ':')))
+    return total
+
+
+def truncate_tokens(text, budget, keep='head'):
+    """Shorten text to at most budget tokens, keeping its start ('head') or its most recent end ('tail').
+
+    Cuts fall on a comma, line or sentence boundary where one is near.
+    """
+    text = str(text or "").strip()
+    if budget <= 0 or not text:
+        return ""
+    if count_tokens(text) <= budget:
+        return text
+
+    encoding = _encoder()
+    if encoding is None:
+        limit = budget * 4
+        cut = text[:limit] if keep == 'head' else text[-limit:]
+    else:
+        tokens = encoding.encode(text, disallowed_special=())
+        cut = encoding.decode(tokens[:budget] if keep == 'head' else tokens[-budget:])
+
+    # Drop the partial entry at the cut unless that would discard most of the text
+    if keep == 'head':
+        boundary = max(cut.rfind(sep) for sep in (',', '\n', '. '))
+        cut = cut[:boundary] if boundary > len(cut) // 2 else cut
+        return cut.rstrip(' ,.') + " ..."
+    boundary = min((i for i in (cut.find(sep) for sep in (',', '\n', '. ')) if i >= 0), default=-1)
+    cut = cut[boundary + 1:] if 0 <= boundary < len(cut) // 2 else cut
+    return "... " + cut.lstrip(' ,.')
+
+
+def compact(text):
+    """Strip indentation and trailing spaces from each line and collapse runs of blank lines"""
+    lines = [line.strip() for line in str(text).strip().splitlines()]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines))
+
+
+def render(template, **values):
+    """Fill a prompt template and compact the result"""
+    return compact(template.format(**values))
+
+
+def log_usage(name, messages, max_tokens, output_tokens=None, tools=None):
+    """Record the estimated input tokens and the budgeted or actual output tokens of a call"""
+    logger.info("%s: ~%d input tokens, %s output tokens", name, count_message_tokens(messages, tools),
+                output_tokens if output_tokens is not None else f"<= {max_tokens}")
+
+
+def requirements(preferences, allergens, cuisine_type, meal_type):
+    """The requirement lines shared by every recommendation prompt"""
+    return render(REQUIREMENTS,
+                  preferences=", ".join(preferences) if preferences else "none",
+                  allergens=", ".join(allergens) if allergens else "none",
+                  cuisine=cuisine_type if cuisine_type and cuisine_type != "All" else "any",
+                  meal=meal_type if meal_type and meal_type != "All" else "any")
+
+
+def history(text, keep='head'):
+    """The user's history or its summary, cut to the history budget; raw histories keep their recent 'tail'"""
+    return truncate_tokens(text, HISTORY_TOKEN_BUDGET, keep) or "not provided"
+
+
+NUTRITIONIST = "You are a nutritionist."
+
+REQUIREMENTS = """
+Dietary preferences (all must be met): {preferences}
+Minimum 20g protein per serving if High-Protein is listed.
+Allergens to avoid (must avoid): {allergens}
+Cuisine: {cuisine}
+Meal type: {meal}
+"""
+
+FOOD_RECOMMENDATIONS = """
+User's food history analysis: {history}
+
+Recommend {item_request} meeting these requirements exactly:
+{requirements}
+
+Return them with full nutrition facts by calling recommend_foods.
+"""
+
+RECIPE_RECOMMENDATIONS = """
+User's food history analysis: {history}
+
+Recommend {item_request} meeting these requirements:
+{requirements}
+
+Return them by calling recommend_recipes.
+"""
+
+COMBINED_RECOMMENDATIONS = """
+User's food history analysis: {history}
+
+Recommend {count} different foods and {count} different recipes meeting these requirements:
+{requirements}
+
+Return both lists by calling recommend_foods_and_recipes.
+"""
+
+FOOD_INSIGHT = """
+Give insights on this food in markdown: health benefits, who benefits most, best times to eat it.
+Food: {name}
+Nutrition: {nutrition}
+Description: {description}
+"""
+
+RECIPE_INSIGHT = """
+Analyze this recipe in markdown: dietary considerations, cooking tips, possible variations.
+Recipe: {name}
+Ingredients: {ingredients}
+Instructions: {instructions}
+"""
+
+RECIPE_SUGGESTIONS = """
+Ingredients on hand: {ingredients}
+Suggest 3 recipes in markdown, each with its name, additional ingredients needed, brief instructions and why it is a good choice.
+"""
+
+RERANK = """
+User's food history: {history}
+
+Rank these options from best to worst fit for what they should eat next:
+{options}
+
+Respond with only a JSON array of the option numbers in ranked order.
+"""
+
+CATALOG_ALTERNATIVES = """
+The user ate: {history}
+Considering their preferences and allergies, recommend three healthier alternatives from this list:
+{options}
+"""
+
+SUMMARY = """
+Summarize this person's dietary profile briefly and professionally: eating patterns and preferences, and key nutritional considerations.
+Recent food history: {history}
+"""
@@ -1,5 +1,23 @@
 import pandas as pd
 import numpy as np
+from utils.diet_rules import get_diet, MACRO_KCAL
+
+# Multipliers applied to the Mifflin St. Jeor BMR for each activity level
+ACTIVITY_MULTIPLIERS = {
+    "Sedentary": 1.2,
+    "Lightly Active": 1.375,
+    "Moderately Active": 1.55,
+    "Very Active": 1.8
+}
+
+# Fixed daily macro targets in grams
+DEFAULT_MACRO_GRAMS = {'protein': 50, 'carbs': 275, 'fat': 55}
+
+# Share of daily energy from each macro when targets are derived from TDEE
+TDEE_MACRO_SPLIT = {'protein': 0.2, 'carbs': 0.5, 'fat': 0.3}
+
+# Profile fields and the defaults calculate_daily_targets uses for them
+PROFILE_DEFAULTS = {'weight': 70, 'height': 170, 'age': 30, 'sex': "Male", 'activity_level': "Sedentary"}
 
 def calculate_bmr(weight, height, age, sex, activity_level):
     """Calculate Basal Metabolic Rate using Mifflin St. Jeor equation with activity multiplier"""
@@ -10,75 +28,179 @@ def calculate_bmr(weight, height, age, sex, activity_level):
         base_bmr = (10 * weight) + (6.25 * height) - (5 * age) - 161
     
     # Apply activity multiplier
-    activity_multipliers = {
-        "Sedentary": 1.2,
-        "Lightly Active": 1.375,
-        "Moderately Active": 1.55,
-        "Very Active": 1.8
-    }
-    
-    return base_bmr * activity_multipliers[activity_level]
+    return base_bmr * ACTIVITY_MULTIPLIERS[activity_level]
+
+def macro_targets(tdee, macro_split=None):
+    """Daily grams of each macro; fixed amounts, or macro_split's energy shares of tdee"""
+    if macro_split is None:
+        return dict(DEFAULT_MACRO_GRAMS)
+    return {macro: tdee * share / MACRO_KCAL[macro] for macro, share in macro_split.items()}
 
-def calculate_daily_targets(weight=70, height=170, age=30, sex="Male", activity_level="Sedentary"):
-    """Calculate recommended daily nutrient targets"""
+def calculate_daily_targets(weight=70, height=170, age=30, sex="Male", activity_level="Sedentary", macro_split=None):
+    """Calculate recommended daily nutrient targets.
+
+    macro_split, such as TDEE_MACRO_SPLIT, derives the macro grams from the
+    TDEE instead of using the fixed defaults.
+    """
     bmr = calculate_bmr(weight, height, age, sex, activity_level)
-    return {
-        'bmr': round(bmr, 2),
-        'protein': 50,  # grams
-        'carbs': 275,   # grams
-        'fat': 55       # grams
-    }
+    targets = {'bmr': round(bmr, 2)}
+    if macro_split is None:
+        targets.update(DEFAULT_MACRO_GRAMS)
+    else:
+        targets.update({macro: round(grams, 1) for macro, grams in macro_targets(bmr, macro_split).items()})
+    return targets
+
+# Whether long double can hold a double scaled by 100 exactly (x86 80-bit extended precision)
+_EXACT_LONG_DOUBLE = np.finfo(np.longdouble).nmant >= 60
+
+def _round_like_python(values, digits):
+    """np.round that agrees with Python's round() on every element.
+
+    np.round scales in double precision, which can land the other side of a
+    tie. Scaling in long double is exact, so halves are broken the same way
+    round() breaks them; without it, values near a tie are rounded one by one.
+    """
+    values = np.asarray(values, dtype=float)
+    if _EXACT_LONG_DOUBLE:
+        return np.rint(values.astype(np.longdouble) * 10 ** digits).astype(float) / 10 ** digits
+    rounded = np.round(values, digits)
+    scaled = values * 10 ** digits
+    for i in np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6):
+        rounded[i] = round(float(values[i]), digits)
+    return rounded
+
+def calculate_bmr_batch(weight, height, age, sex, activity_level):
+    """calculate_bmr for arrays of profiles at once"""
+    weight, height, age = (np.asarray(values, dtype=float) for values in (weight, height, age))
+    # Same operation order as calculate_bmr so results match it exactly
+    base_bmr = (10 * weight) + (6.25 * height) - (5 * age) + np.where(np.asarray(sex) == "Male", 5, -161)
+    levels = pd.Categorical(np.asarray(activity_level, dtype=object), categories=list(ACTIVITY_MULTIPLIERS))
+    if (levels.codes < 0).any():
+        unknown = set(np.asarray(activity_level, dtype=object)[levels.codes < 0])
+        raise KeyError(f"Unknown activity levels: {sorted(map(str, unknown))}")
+    return base_bmr * np.array(list(ACTIVITY_MULTIPLIERS.values()))[levels.codes]
+
+def calculate_daily_targets_batch(profiles=None, macro_split=None, **columns):
+    """calculate_daily_targets for many profiles in one vectorized pass.
+
+    profiles is a DataFrame with weight, height, age, sex and
+    activity_level columns; arrays may be passed as keyword arguments
+    instead. Missing fields take calculate_daily_targets' defaults. Returns
+    a DataFrame of bmr, protein, carbs and fat with one row per profile.
+    """
+    if profiles is None:
+        profiles = pd.DataFrame(columns)
+    size = len(profiles)
+    fields = {field: profiles[field].to_numpy() if field in profiles.columns else np.full(size, default)
+              for field, default in PROFILE_DEFAULTS.items()}
+    bmr = calculate_bmr_batch(**fields)
+    targets = pd.DataFrame({'bmr': _round_like_python(bmr, 2)}, index=profiles.index)
+    for macro, grams in macro_targets(bmr, macro_split).items():
+        targets[macro] = _round_like_python(grams, 1) if macro_split is not None else grams
+    return targets
 
 def calculate_consumed_nutrients(recent_foods):
-    """Calculate total nutrients from recently consumed foods"""
+    """Calculate total nutrients from recently consumed foods.
+
+    An IntakeDay from the intake ledger already carries running totals and
+    is not re-summed.
+    """
+    if hasattr(recent_foods, 'totals'):
+        return recent_foods.totals()
+
     consumed = {
         'protein': 0,
         'carbs': 0,
-        'fat': 0
+        'fat': 0,
+        'calories': 0
     }
     
     for food in recent_foods:
         consumed['protein'] += food['protein']
         consumed['carbs'] += food['carbs']
         consumed['fat'] += food['fat']
+        consumed['calories'] += food.get('calories', 0)
     
     return consumed
 
-def get_nutrient_scores(foods_df, recent_foods):
-    """Score foods based on how well they complement recent consumption"""
+# Nutrients scored by the engine and the daily target each one is measured against
+SCORED_NUTRIENTS = ['protein', 'carbs', 'fat', 'calories']
+TARGET_KEYS = {'protein': 'protein', 'carbs': 'carbs', 'fat': 'fat', 'calories': 'bmr'}
+
+def nutrient_matrix(foods_df, nutrients=SCORED_NUTRIENTS):
+    """Stack nutrient columns into an (items x nutrients) float matrix; missing values count as 0"""
+    columns = [
+        pd.to_numeric(foods_df[nutrient], errors='coerce').to_numpy(dtype=float)
+        if nutrient in foods_df.columns else np.zeros(len(foods_df))
+        for nutrient in nutrients
+    ]
+    return np.nan_to_num(np.column_stack(columns))
+
+def score_nutrients(matrix, remaining, weights=None):
+    """Score every row of a nutrient matrix in one pass.
+
+    Each nutrient still needed contributes the fraction of the remaining
+    amount a food covers (capped at 1), and the weighted average is scaled
+    to 0-100. Rows score a neutral 50 when nothing is needed anymore.
+    """
+    remaining = np.maximum(np.asarray(remaining, dtype=float), 0)
+    weights = np.ones_like(remaining) if weights is None else np.asarray(weights, dtype=float)
+    weights = np.where(remaining > 0, weights, 0)
+    if weights.sum() <= 0:
+        return np.full(len(matrix), 50.0)
+
+    coverage = np.minimum(matrix, remaining) / np.where(remaining > 0, remaining, 1)
+    return coverage @ (weights / weights.sum()) * 100
+
+def top_k_indices(scores, k):
+    """Positions of the k highest scores, best first, without sorting the whole array"""
+    scores = np.asarray(scores)
+    if k >= len(scores):
+        return np.argsort(-scores, kind='stable')
+    if k <= 0:
+        return np.array([], dtype=int)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+def get_nutrient_scores(foods_df, recent_foods, targets=None, weights=None, diet_type=None):
+    """Score foods based on how well they complement recent consumption.
+
+    targets is the user's calculate_daily_targets() result and weights an
+    optional mapping of nutrient name to relative importance. A diet_type
+    supplies default weights and scales each score by how well the food's
+    macro split fits the diet.
+    """
+    diet = get_diet(diet_type)
     if not recent_foods:
-        return pd.Series(1, index=foods_df.index)
+        if diet is None:
+            return pd.Series(1, index=foods_df.index)
+        return pd.Series(diet.fit(nutrient_matrix(foods_df), SCORED_NUTRIENTS), index=foods_df.index)
         
-    targets = calculate_daily_targets()
+    targets = targets or calculate_daily_targets()
     consumed = calculate_consumed_nutrients(recent_foods)
     
     # Calculate remaining nutrients needed
-    remaining = {
-        nutrient: max(0, targets[nutrient] - consumed[nutrient])
-        for nutrient in targets
-    }
-    
-    # Calculate scores based on how well each food fills remaining needs
-    scores = []
-    for _, food in foods_df.iterrows():
-        score = 0
-        total_remaining = sum(remaining.values())
-        
-        if total_remaining > 0:
-            for nutrient in ['protein', 'carbs', 'fat']:
-                if remaining[nutrient] > 0:
-                    contribution = min(food[nutrient], remaining[nutrient])
-                    score += (contribution / total_remaining) * 100
-        else:
-            score = 50  # neutral score if no specific nutrients needed
-            
-        scores.append(score)
+    remaining = [
+        targets[TARGET_KEYS[nutrient]] - consumed[nutrient]
+        for nutrient in SCORED_NUTRIENTS
+    ]
+    weights = weights or (diet.weights if diet is not None else None)
+    weight_vector = None
+    if weights:
+        weight_vector = [weights.get(nutrient, 0) for nutrient in SCORED_NUTRIENTS]
     
+    matrix = nutrient_matrix(foods_df)
+    scores = score_nutrients(matrix, remaining, weight_vector)
+    if diet is not None:
+        scores = scores * diet.fit(matrix, SCORED_NUTRIENTS)
     return pd.Series(scores, index=foods_df.index)
 
-def rank_recommendations(foods_df, recent_foods):
-    """Rank food recommendations based on nutritional needs"""
-    scores = get_nutrient_scores(foods_df, recent_foods)
-    return foods_df.assign(recommendation_score=scores).sort_values(
-        'recommendation_score', ascending=False
-    )
+def rank_recommendations(foods_df, recent_foods, targets=None, weights=None, top_k=None, diet_type=None):
+    """Rank food recommendations based on nutritional needs, optionally keeping only the top_k"""
+    scores = get_nutrient_scores(foods_df, recent_foods, targets, weights, diet_type)
+    if top_k is None:
+        return foods_df.assign(recommendation_score=scores).sort_values(
+            'recommendation_score', ascending=False
+        )
+    positions = top_k_indices(scores.to_numpy(), top_k)
+    return foods_df.iloc[positions].assign(recommendation_score=scores.iloc[positions].to_numpy())
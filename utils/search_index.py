@@ -0,0 +1,154 @@
+import re
+from bisect import bisect_left
+from collections import defaultdict
+import numpy as np
+
+# Fields searched and their weight in a document's term frequencies
+DEFAULT_FIELDS = {'name': 3.0, 'description': 1.0, 'ingredients': 1.5}
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Relative weight of a query term matched by prefix or by edit distance instead of exactly
+PREFIX_WEIGHT = 0.8
+FUZZY_WEIGHT = 0.7
+
+
+def tokenize(text):
+    """Lower-case word tokens of a text"""
+    return re.findall(r"[a-z0-9]+", str(text).lower())
+
+
+def _trigrams(term):
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _max_edits(term):
+    """Typos tolerated for a query term of this length"""
+    if len(term) < 4:
+        return 0
+    return 1 if len(term) < 8 else 2
+
+
+def edit_distance(a, b, limit):
+    """Edit distance between a and b counting a swap of adjacent letters as one edit,
+    or limit + 1 once it is known to exceed limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before, previous = None, list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                cost = min(cost, before[j - 2] + 1)
+            current.append(cost)
+        if min(current) > limit:
+            return limit + 1
+        before, previous = previous, current
+    return previous[-1]
+
+
+class SearchIndex:
+    """Inverted index with BM25 ranking, typo tolerance and prefix matching over a frame's text columns"""
+
+    def __init__(self, df, fields=None):
+        fields = {field: weight for field, weight in (fields or DEFAULT_FIELDS).items() if field in df.columns}
+        self.size = len(df)
+        self.names = df['name'].astype(str).tolist() if 'name' in df.columns else [''] * self.size
+
+        # Weighted term frequencies per document
+        postings = defaultdict(dict)
+        lengths = np.zeros(self.size, dtype=np.float32)
+        for field, weight in fields.items():
+            for doc, text in enumerate(df[field].tolist()):
+                if text is None or text != text:
+                    continue
+                tokens = tokenize(str(text).replace('|', ' '))
+                lengths[doc] += weight * len(tokens)
+                for token in tokens:
+                    postings[token][doc] = postings[token].get(doc, 0.0) + weight
+
+        # BM25 weights are precomputed per posting, so a query only sums arrays
+        avg_length = lengths.mean() if self.size and lengths.mean() > 0 else 1.0
+        norm = K1 * (1 - B + B * lengths / avg_length)
+        self.terms = sorted(postings)
+        self.term_ids = {term: i for i, term in enumerate(self.terms)}
+        self.doc_ids = []
+        self.weights = []
+        for term in self.terms:
+            docs = np.fromiter(postings[term].keys(), dtype=np.int32)
+            tf = np.fromiter(postings[term].values(), dtype=np.float32)
+            idf = np.log(1 + (self.size - len(docs) + 0.5) / (len(docs) + 0.5))
+            self.doc_ids.append(docs)
+            self.weights.append((idf * tf * (K1 + 1) / (tf + norm[docs])).astype(np.float32))
+
+        # Trigram index over the vocabulary, used to find candidates for misspelled terms
+        self.trigrams = defaultdict(list)
+        for term_id, term in enumerate(self.terms):
+            for gram in _trigrams(term):
+                self.trigrams[gram].append(term_id)
+
+    def _prefix_terms(self, prefix, limit=50):
+        start = bisect_left(self.terms, prefix)
+        matches = []
+        for term in self.terms[start:start + limit]:
+            if not term.startswith(prefix):
+                break
+            matches.append(self.term_ids[term])
+        return matches
+
+    def _fuzzy_terms(self, term):
+        edits = _max_edits(term)
+        if not edits:
+            return []
+        grams = _trigrams(term)
+        counts = defaultdict(int)
+        for gram in grams:
+            for term_id in self.trigrams.get(gram, ()):
+                counts[term_id] += 1
+        # Each edit can break at most four trigrams (a swap of adjacent letters)
+        needed = max(1, len(grams) - 4 * edits)
+        return [term_id for term_id, shared in counts.items()
+                if shared >= needed and edit_distance(term, self.terms[term_id], edits) <= edits]
+
+    def _expand(self, token, prefix):
+        """Index terms a query token matches, with the weight of each kind of match"""
+        expansions = {}
+        if token in self.term_ids:
+            expansions[self.term_ids[token]] = 1.0
+        if prefix:
+            for term_id in self._prefix_terms(token):
+                expansions.setdefault(term_id, PREFIX_WEIGHT)
+        if not expansions:
+            for term_id in self._fuzzy_terms(token):
+                expansions.setdefault(term_id, FUZZY_WEIGHT)
+        return expansions
+
+    def scores(self, query, prefix=False):
+        """BM25 score of every document; prefix lets the last query token match as a prefix"""
+        scores = np.zeros(self.size, dtype=np.float32)
+        tokens = tokenize(query)
+        for i, token in enumerate(tokens):
+            for term_id, weight in self._expand(token, prefix and i == len(tokens) - 1).items():
+                scores[self.doc_ids[term_id]] += weight * self.weights[term_id]
+        return scores
+
+    def search(self, query, limit=None, prefix=False):
+        """Positions of matching documents, best first"""
+        scores = self.scores(query, prefix)
+        matches = np.flatnonzero(scores > 0)
+        if limit is not None and limit < len(matches):
+            matches = matches[np.argpartition(-scores[matches], limit - 1)[:limit]]
+        return matches[np.argsort(-scores[matches], kind='stable')]
+
+    def suggest(self, text, limit=5):
+        """Names of the best matches for partially typed text, for search-as-you-type"""
+        suggestions = []
+        for position in self.search(text, limit=limit * 2, prefix=True):
+            name = self.names[position]
+            if name not in suggestions:
+                suggestions.append(name)
+        return suggestions[:limit]
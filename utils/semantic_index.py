@@ -0,0 +1,96 @@
+import numpy as np
+from utils.search_index import tokenize
+
+# Text columns embedded for each item
+DEFAULT_FIELDS = ['name', 'description', 'ingredients', 'dietary_info', 'allergens', 'cuisine_type', 'meal_type']
+
+
+def _coo_matmul(rows, cols, vals, shape, dense):
+    """Sparse (rows, cols, vals) matrix of shape times a dense matrix"""
+    out = np.empty((shape[0], dense.shape[1]))
+    for j in range(dense.shape[1]):
+        out[:, j] = np.bincount(rows, weights=vals * dense[cols, j], minlength=shape[0])
+    return out
+
+
+class SemanticIndex:
+    """TF-IDF + truncated SVD (latent semantic) embeddings of a frame's text, searched by cosine similarity"""
+
+    def __init__(self, df, fields=None, dimensions=64, seed=0):
+        fields = [field for field in (fields or DEFAULT_FIELDS) if field in df.columns]
+        self.size = len(df)
+
+        # Term counts per document
+        self.vocab = {}
+        rows, cols = [], []
+        texts = df[fields].astype(str).agg(' '.join, axis=1).tolist() if fields else [''] * self.size
+        for doc, text in enumerate(texts):
+            for token in tokenize(text.replace('|', ' ')):
+                rows.append(doc)
+                cols.append(self.vocab.setdefault(token, len(self.vocab)))
+        rows, cols = np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64)
+
+        # Sublinear TF-IDF, merged into one entry per (document, term)
+        keys, counts = np.unique(rows * max(1, len(self.vocab)) + cols, return_counts=True)
+        self.rows = keys // max(1, len(self.vocab))
+        self.cols = keys % max(1, len(self.vocab))
+        doc_freq = np.bincount(self.cols, minlength=len(self.vocab))
+        self.idf = np.log((1 + self.size) / (1 + doc_freq)) + 1
+        self.vals = (1 + np.log(counts)) * self.idf[self.cols]
+        norms = np.sqrt(np.bincount(self.rows, weights=self.vals ** 2, minlength=self.size))
+        self.vals = self.vals / np.where(norms > 0, norms, 1)[self.rows]
+
+        self.components = self._truncated_svd(dimensions, seed)
+        self.doc_vectors = self._normalize(
+            _coo_matmul(self.rows, self.cols, self.vals, (self.size, len(self.vocab)), self.components)
+        ).astype(np.float32)
+
+    def _truncated_svd(self, dimensions, seed):
+        """Top right singular vectors of the TF-IDF matrix by randomized SVD (terms x k)"""
+        n_terms = len(self.vocab)
+        k = max(1, min(dimensions, self.size, n_terms))
+        if n_terms == 0 or self.size == 0:
+            return np.zeros((n_terms, k))
+        shape = (self.size, n_terms)
+        transposed = (n_terms, self.size)
+        sample = min(k + 10, self.size, n_terms)
+
+        rng = np.random.default_rng(seed)
+        q, _ = np.linalg.qr(_coo_matmul(self.rows, self.cols, self.vals, shape, rng.standard_normal((n_terms, sample))))
+        # Power iterations sharpen the spectrum for better accuracy
+        for _ in range(2):
+            z, _ = np.linalg.qr(_coo_matmul(self.cols, self.rows, self.vals, transposed, q))
+            q, _ = np.linalg.qr(_coo_matmul(self.rows, self.cols, self.vals, shape, z))
+        projected = _coo_matmul(self.cols, self.rows, self.vals, transposed, q).T
+        _, _, vt = np.linalg.svd(projected, full_matrices=False)
+        return vt[:k].T
+
+    @staticmethod
+    def _normalize(vectors):
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms > 0, norms, 1)
+
+    def embed(self, text):
+        """Unit-length embedding of a free-text query"""
+        vector = np.zeros(len(self.vocab))
+        for token in tokenize(text):
+            term = self.vocab.get(token)
+            if term is not None:
+                vector[term] += 1
+        present = vector > 0
+        vector[present] = (1 + np.log(vector[present])) * self.idf[present]
+        return self._normalize(vector @ self.components).astype(np.float32)
+
+    def similarities(self, text):
+        """Cosine similarity of every item to text"""
+        return self.doc_vectors @ self.embed(text)
+
+    def search(self, text, k=10):
+        """Positions and similarities of the k items most relevant to text, best first"""
+        scores = self.similarities(text)
+        k = min(k, self.size)
+        if k <= 0:
+            return np.array([], dtype=int), np.array([], dtype=np.float32)
+        positions = np.argpartition(-scores, k - 1)[:k]
+        positions = positions[np.argsort(-scores[positions], kind='stable')]
+        return positions, scores[positions]
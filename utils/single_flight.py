@@ -0,0 +1,116 @@
+import hashlib
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; calls are then only coalesced within a process
+    fcntl = None
+
+class _Call:
+    """One in-flight execution that other callers can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def finish(self, result):
+        self.result = result
+        self.done.set()
+
+    def fail(self, error):
+        self.error = error
+        self.done.set()
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one execution.
+
+    Threads in a process share a result directly. With a lock_dir, the
+    leader also holds a file lock for the key, so leaders in other worker
+    processes wait and can then pick the result up from a shared cache.
+    """
+
+    def __init__(self, lock_dir=None):
+        self.lock_dir = lock_dir if fcntl is not None else None
+        if self.lock_dir:
+            os.makedirs(self.lock_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def join(self, key):
+        """Return (call, is_leader); the leader must run the work and then call leave()"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                return call, False
+            call = self._calls[key] = _Call()
+            return call, True
+
+    def leave(self, key, call):
+        """Stop sharing call; later callers with the same key start a new execution"""
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        if not call.done.is_set():
+            call.fail(RuntimeError("Shared call ended without a result"))
+
+    @contextmanager
+    def process_lock(self, key):
+        """Hold the cross-process lock for key while the body runs.
+
+        Each key has its own lock file, removed by the holder on release, so
+        only callers with the same key wait on each other.
+        """
+        if not self.lock_dir:
+            yield
+            return
+        path = os.path.join(self.lock_dir, hashlib.sha256(key.encode('utf-8')).hexdigest() + ".lock")
+        while True:
+            lock_file = open(path, 'a')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                # The previous holder may have removed the file while this one waited; lock the current one
+                try:
+                    current = os.stat(path).st_ino == os.fstat(lock_file.fileno()).st_ino
+                except FileNotFoundError:
+                    current = False
+            except BaseException:
+                lock_file.close()
+                raise
+            if current:
+                break
+            lock_file.close()
+        try:
+            yield
+        finally:
+            # Removed before unlocking so a waiter that then gets the lock retries on a fresh file
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            lock_file.close()
+
+    def do(self, key, fn):
+        """Run fn once for all concurrent callers with key and return its result to each"""
+        call, leader = self.join(key)
+        if not leader:
+            return call.wait()
+        try:
+            with self.process_lock(key):
+                result = fn()
+            call.finish(result)
+            return result
+        except Exception as e:
+            call.fail(e)
+            raise
+        finally:
+            self.leave(key, call)
@@ -0,0 +1,96 @@
+import os
+import time
+from io import StringIO
+import pandas as pd
+from utils.llm_cache import CACHE_DIR, ResponseCache, make_key
+
+# Profiles, food histories and recent recommendation runs; least recently seen users are evicted first
+user_store = ResponseCache(
+    os.getenv("USER_STORE_PATH", os.path.join(CACHE_DIR, "users.sqlite3")),
+    ttl=None,
+    max_bytes=int(os.getenv("USER_STORE_MAX_BYTES", str(200 * 1024 * 1024))),
+    max_entries=int(os.getenv("USER_STORE_MAX_USERS", "10000")))
+
+# Recommendation runs kept per user, most recent first
+MAX_RUNS = int(os.getenv("USER_STORE_MAX_RUNS", "5"))
+
+# Profile name used until the user picks one
+DEFAULT_USER = "local"
+
+
+def inputs_key(food_history, use_openai_only, preferences, allergens, cuisine_type, meal_type, count):
+    """Key of everything a recommendation run depends on"""
+    return make_key('recommendations', food_history, use_openai_only, sorted(preferences or []),
+                    sorted(allergens or []), cuisine_type, meal_type, count)
+
+
+def _frame_to_json(df):
+    """A frame as JSON with its column types, so empty numeric columns stay numeric"""
+    if df is None or df.empty:
+        return None
+    return {'frame': df.to_json(orient='split', index=False), 'dtypes': df.dtypes.astype(str).to_dict()}
+
+
+def _frame_from_json(stored):
+    if not stored:
+        return pd.DataFrame()
+    df = pd.read_json(StringIO(stored['frame']), orient='split', dtype=False, convert_dates=False)
+    return df.astype(stored['dtypes'])
+
+
+def _record(user):
+    return user_store.get(f"user:{user}") or {'profile': {}, 'runs': []}
+
+
+def load_profile(user):
+    """The user's saved profile (filters and food history), or an empty dict"""
+    try:
+        return _record(user)['profile']
+    except Exception as e:
+        print(f"Error loading profile: {e}")
+        return {}
+
+
+def save_profile(user, profile):
+    """Store the user's profile, keeping their saved runs"""
+    try:
+        record = _record(user)
+        record['profile'] = profile
+        user_store.set(f"user:{user}", record)
+    except Exception as e:
+        print(f"Error saving profile: {e}")
+
+
+def load_run(user, key=None):
+    """A saved recommendation run for the inputs key, or the latest run, or None.
+
+    Runs are dicts with summary, use_openai_only and the foods and recipes
+    frames. Catalog runs store no frames; their rows come from the catalog.
+    """
+    try:
+        runs = _record(user)['runs']
+        run = next((run for run in runs if key is None or run['key'] == key), None)
+        if run is None:
+            return None
+        return {**run, 'foods': _frame_from_json(run['foods']), 'recipes': _frame_from_json(run['recipes'])}
+    except Exception as e:
+        print(f"Error loading saved recommendations: {e}")
+        return None
+
+
+def save_run(user, key, summary, foods_df, recipes_df, use_openai_only):
+    """Remember a run's results so the same inputs need not be generated again"""
+    try:
+        record = _record(user)
+        run = {
+            'key': key,
+            'summary': summary,
+            'use_openai_only': use_openai_only,
+            'foods': _frame_to_json(foods_df) if use_openai_only else None,
+            'recipes': _frame_to_json(recipes_df) if use_openai_only else None,
+            'created': time.time()
+        }
+        record['runs'] = [run] + [r for r in record['runs'] if r['key'] != key][:MAX_RUNS - 1]
+        user_store.set(f"user:{user}", record)
+    except Exception as e:
+        print(f"Error saving recommendations: {e}")